@@ -0,0 +1,180 @@
+"""
+Offline stand-ins used by the benchmark harness: a scripted LLM, a local
+Supabase replacement and a Slack web client.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Any, Dict, List, Optional, Sequence
+import asyncio
+import random
+import time
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+# ========== Fake LLM provider ==========
+
+@dataclass
+class ModelScript:
+    """
+    What a fake model does on each run.
+
+    Attributes:
+        latency_ms: Simulated time per model request.
+        jitter_ms: Random extra latency, uniformly distributed in [0, jitter_ms].
+        tool_calls: Tools to call, one per model turn, before giving the final answer.
+            Names not offered to the agent are skipped; `*` means "next available tool".
+        answer: Final text answer.
+    """
+    latency_ms: float = 200.0
+    jitter_ms: float = 0.0
+    tool_calls: Sequence[str] = ("*",)
+    answer: str = "Here is what I found."
+
+
+def _turns_since_prompt(messages: List[ModelMessage]) -> int:
+    """Count tool-return rounds since the latest user prompt in the current run."""
+    turns = 0
+    for message in reversed(messages):
+        if isinstance(message, ModelRequest):
+            if any(isinstance(part, UserPromptPart) for part in message.parts):
+                break
+            if any(isinstance(part, ToolReturnPart) for part in message.parts):
+                turns += 1
+    return turns
+
+
+def scripted_model(script: ModelScript, name: str = "scripted") -> FunctionModel:
+    """Build a FunctionModel that follows `script` with simulated latency."""
+    round_robin = count()
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep((script.latency_ms + random.uniform(0, script.jitter_ms)) / 1000)
+        turn = _turns_since_prompt(messages)
+        available = [tool.name for tool in info.function_tools]
+        if turn < len(script.tool_calls) and available:
+            wanted = script.tool_calls[turn]
+            if wanted == "*":
+                tool = info.function_tools[next(round_robin) % len(available)]
+            else:
+                tool = next((t for t in info.function_tools if t.name == wanted), None)
+            if tool is not None:
+                # Fill the first parameter of the tool, whatever it's called
+                arg_name = next(iter(tool.parameters_json_schema.get("properties", {})), "query")
+                return ModelResponse(parts=[ToolCallPart(tool_name=tool.name, args={arg_name: f"benchmark turn {turn}"})])
+        return ModelResponse(parts=[TextPart(content=script.answer)])
+
+    return FunctionModel(respond, model_name=name)
+
+
+# ========== Local Supabase stand-in ==========
+
+@dataclass
+class _Response:
+    data: List[Dict[str, Any]]
+
+
+class _Query:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._columns = "*"
+        self._filters: List[tuple] = []
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._insert: Optional[Dict[str, Any]] = None
+
+    def select(self, columns: str = "*") -> "_Query":
+        self._columns = columns
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append((column, value))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n: int) -> "_Query":
+        self._limit = n
+        return self
+
+    def insert(self, row: Dict[str, Any]) -> "_Query":
+        self._insert = row
+        return self
+
+    def execute(self) -> _Response:
+        # The real client is synchronous, so block the event loop the same way it does
+        if self._db.latency_ms:
+            time.sleep(self._db.latency_ms / 1000)
+        return self._db._execute(self)
+
+
+def _project(row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+    """Apply a PostgREST-style column list (`a,b`, `alias:col->>key`) to a row."""
+    if columns.strip() == "*":
+        return dict(row)
+    projected = {}
+    for column in columns.split(","):
+        column = column.strip()
+        alias, _, expr = column.rpartition(":")
+        if "->>" in expr or "->" in expr:
+            base, _, key = expr.replace("->>", "->").partition("->")
+            value = (row.get(base) or {}).get(key)
+            projected[alias or key] = value
+        else:
+            projected[alias or expr] = row.get(expr)
+    return projected
+
+
+@dataclass
+class FakeSupabase:
+    """In-memory replacement for the subset of the Supabase client used by supabase_utils."""
+    latency_ms: float = 0.0
+    tables: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    _ids: Any = field(default_factory=count)
+    _clock: datetime = field(default_factory=lambda: datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def _execute(self, query: _Query) -> _Response:
+        rows = self.tables.setdefault(query._table, [])
+        if query._insert is not None:
+            self._clock += timedelta(milliseconds=1)
+            row = {"id": next(self._ids), "created_at": self._clock.isoformat(), **query._insert}
+            rows.append(row)
+            return _Response(data=[row])
+        result = [row for row in rows if all(row.get(col) == value for col, value in query._filters)]
+        if query._order:
+            column, desc = query._order
+            result.sort(key=lambda row: row.get(column), reverse=desc)
+        if query._limit is not None:
+            result = result[:query._limit]
+        return _Response(data=[_project(row, query._columns) for row in result])
+
+
+# ========== Slack web client stand-in ==========
+
+@dataclass
+class FakeSlackClient:
+    """Records chat_postMessage calls instead of sending them."""
+    latency_ms: float = 50.0
+    sent: List[Dict[str, Any]] = field(default_factory=list)
+
+    async def chat_postMessage(self, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        ts = f"{time.time():.6f}"
+        self.sent.append({**kwargs, "ts": ts})
+        return {"ok": True, "channel": kwargs.get("channel"), "ts": ts}
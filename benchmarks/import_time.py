@@ -0,0 +1,135 @@
+"""
+Import-time benchmark based on `python -X importtime`.
+
+Imports each module in a fresh interpreter, reports its cumulative import time
+and the heaviest dependencies it pulled in, and appends the result to a local
+history file (benchmarks/import_time_history.jsonl, not committed) so regressions
+can be tracked across commits on the same machine.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--top 10] [--budget-ms 800] [module ...]
+"""
+from __future__ import annotations
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY_FILE = Path(__file__).resolve().parent / "import_time_history.jsonl"
+DEFAULT_MODULES = [
+    "mcp_agent_army_endpoint",
+    "mcp_agent_army",
+    "bolt_app",
+    "slack_event_handler",
+    "supabase_utils",
+]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse `-X importtime` output into (module, self_us, cumulative_us, depth) tuples."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module: str) -> Dict[str, object]:
+    """Import `module` in a fresh interpreter and return its cumulative time and heaviest direct imports."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = parse_importtime(proc.stderr)
+    total = next(cumulative for name, _, cumulative, depth in reversed(rows) if name == module and depth <= 1)
+    # Top-level packages pulled in by the module, by cumulative time
+    packages: Dict[str, int] = {}
+    for name, _, cumulative, depth in rows:
+        if depth == 1 and name != module:
+            packages[name] = max(packages.get(name, 0), cumulative)
+    return {"total_us": total, "packages": packages}
+
+
+def run(modules: List[str], runs: int) -> Dict[str, Dict[str, object]]:
+    results = {}
+    for module in modules:
+        samples = [measure(module) for _ in range(runs)]
+        packages: Dict[str, List[int]] = {}
+        for sample in samples:
+            for name, us in sample["packages"].items():
+                packages.setdefault(name, []).append(us)
+        results[module] = {
+            "median_ms": round(statistics.median(s["total_us"] for s in samples) / 1000, 1),
+            "packages_ms": {name: round(statistics.median(us) / 1000, 1) for name, us in packages.items()},
+        }
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    proc = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or None
+
+
+def last_entry() -> Optional[dict]:
+    if not HISTORY_FILE.exists():
+        return None
+    lines = [line for line in HISTORY_FILE.read_text().splitlines() if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help=f"Modules to import (default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest dependencies to show per module")
+    parser.add_argument("--budget-ms", type=float, help="Exit non-zero if any module exceeds this median import time")
+    parser.add_argument("--no-record", action="store_true", help="Don't append the result to the history file")
+    args = parser.parse_args()
+
+    modules = args.modules or DEFAULT_MODULES
+    previous = last_entry()
+    results = run(modules, args.runs)
+
+    for module, result in results.items():
+        delta = ""
+        if previous and module in previous.get("modules", {}):
+            change = result["median_ms"] - previous["modules"][module]["median_ms"]
+            delta = f" ({change:+.1f}ms vs {previous.get('revision') or 'previous'})"
+        print(f"{module}: {result['median_ms']:.1f}ms{delta}")
+        heaviest = sorted(result["packages_ms"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, ms in heaviest:
+            print(f"    {ms:>8.1f}ms  {name}")
+
+    if not args.no_record:
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "modules": {module: {"median_ms": result["median_ms"]} for module, result in results.items()},
+        }
+        with open(HISTORY_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Recorded in {HISTORY_FILE.relative_to(ROOT)}")
+
+    if args.budget_ms is not None:
+        over = [module for module, result in results.items() if result["median_ms"] > args.budget_ms]
+        if over:
+            print(f"Over the {args.budget_ms:.0f}ms budget: {', '.join(over)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Offline load generator for the request paths.
+
+Drives one of the entry points with a scripted fake LLM, stub MCP stdio servers
+(benchmarks/stub_mcp_server.py) and an in-memory Supabase stand-in, then reports
+throughput, latency percentiles and event-loop lag. Needs no network access or
+API keys, so results are comparable between runs and machines.
+
+Targets:
+    api           POST /api/mcp-agent-army through the FastAPI app (in-process ASGI)
+    bolt          bolt_app.handle_message with a fake `say`
+    slack-events  slack_event_handler.process_slack_event with a fake Slack client
+
+Usage:
+    python benchmarks/load_test.py --target api --requests 200 --concurrency 20
+"""
+from __future__ import annotations
+from contextlib import AsyncExitStack, nullcontext, redirect_stdout
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fakes import FakeSlackClient, FakeSupabase, ModelScript, scripted_model
+from mcp_servers import MCPServerSpec
+from service_registry import ServiceConfig, load_services
+
+STUB_SERVER = Path(__file__).resolve().parent / "stub_mcp_server.py"
+SUB_AGENT_TIER = "benchmark-subagent"
+
+
+# ========== Harness setup ==========
+
+def stub_services(count: int) -> List[ServiceConfig]:
+    """The registry's services with their MCP servers replaced by the stub server."""
+    services = load_services(include_disabled=True)[:count]
+    stub = MCPServerSpec(name="stub", command=sys.executable, args=(str(STUB_SERVER),))
+    return [
+        replace(service, server=replace(stub, name=service.name), model_tier=SUB_AGENT_TIER, enabled=True)
+        for service in services
+    ]
+
+
+def install_fake_supabase(latency_ms: float) -> FakeSupabase:
+    import supabase_utils
+    db = FakeSupabase(latency_ms=latency_ms)
+    supabase_utils.get_supabase_client = lambda: db
+    return db
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps for a fixed interval."""
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+# ========== Targets ==========
+
+async def make_target(name: str, agent: Any, args: argparse.Namespace) -> Callable[[int], Awaitable[None]]:
+    """Return a coroutine function that performs request number `i` against the chosen entry point."""
+    if name == "api":
+        import httpx
+        from mcp_agent_army_endpoint import create_app
+        os.environ["API_BEARER_TOKEN"] = "benchmark-token"
+        app = create_app()
+        app.state.primary_agent = agent  # The lifespan isn't run; the harness owns the agent
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+
+        async def call_api(i: int) -> None:
+            response = await client.post(
+                "/api/mcp-agent-army",
+                headers={"Authorization": "Bearer benchmark-token"},
+                json={"query": f"benchmark query {i}", "user_id": "bench", "request_id": f"bench-{i}",
+                      "session_id": f"bench-session-{i % args.sessions}"},
+            )
+            if response.status_code != 200 or not response.json().get("success"):
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return call_api
+
+    if name == "bolt":
+        from bolt_app import handle_message
+
+        async def call_bolt(i: int) -> None:
+            replies: List[str] = []
+
+            async def say(text: str, **kwargs: Any) -> None:
+                await asyncio.sleep(args.slack_latency_ms / 1000)
+                replies.append(text)
+
+            message = {"user": f"U{i % args.sessions}", "text": f"benchmark query {i}", "channel": "CBENCH", "ts": f"{i}.0"}
+            await handle_message(message, say, lambda: agent)
+            if not replies or replies[-1].startswith("Sorry"):
+                raise RuntimeError(f"unexpected reply: {replies[-1] if replies else None!r}")
+        return call_bolt
+
+    if name == "slack-events":
+        from slack_event_handler import process_slack_event
+        slack_client = FakeSlackClient(latency_ms=args.slack_latency_ms)
+
+        async def call_slack_events(i: int) -> None:
+            # Replies are handed to the delivery queue, so this measures time until the reply is queued
+            await process_slack_event(
+                text=f"benchmark query {i}", user_id=f"U{i % args.sessions}", channel=f"CBENCH{i % args.sessions}",
+                session_id=f"bench-session-{i % args.sessions}", request_id=f"bench-{i}",
+                primary_agent=agent, slack_client=slack_client,
+            )
+        return call_slack_events
+
+    raise ValueError(f"Unknown target: {name}")
+
+
+# ========== Load generator ==========
+
+async def run_load(target: Callable[[int], Awaitable[None]], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    next_request = iter(range(requests))
+    monitor = LoopLagMonitor()
+
+    async def worker() -> None:
+        for i in next_request:
+            start = time.perf_counter()
+            try:
+                await target(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    ms = lambda seconds: round(seconds * 1000, 1)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(max(latencies, default=0.0)),
+        },
+        "loop_lag_ms": {
+            "p50": ms(percentile(monitor.samples, 50)),
+            "p99": ms(percentile(monitor.samples, 99)),
+            "max": ms(max(monitor.samples, default=0.0)),
+        },
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    from mcp_agent_army import build_mcp_agent_army
+
+    os.environ["STUB_MCP_LATENCY_MS"] = str(args.mcp_latency_ms)
+    os.environ["STUB_MCP_PAYLOAD_BYTES"] = str(args.payload_bytes)
+    install_fake_supabase(args.supabase_latency_ms)
+
+    orchestrator_script = ModelScript(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                                      tool_calls=args.orchestrator_tools.split(",") if args.orchestrator_tools else ())
+    sub_agent_script = ModelScript(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                                   tool_calls=("*",) * args.sub_agent_tool_calls)
+
+    def model_factory(tier: str):
+        # With AGENT_RECORD_DIR set, runs are recorded for benchmarks/replay.py like real ones
+        from recording import with_recording
+        if tier == SUB_AGENT_TIER:
+            return with_recording(scripted_model(sub_agent_script, name="fake-sub-agent"))
+        return with_recording(scripted_model(orchestrator_script, name="fake-orchestrator"))
+
+    primary_agent, sub_agents = build_mcp_agent_army(stub_services(args.services), model_factory=model_factory)
+    async with AsyncExitStack() as stack:
+        for sub_agent in sub_agents.values():
+            await stack.enter_async_context(sub_agent.agent.run_mcp_servers())
+        target = await make_target(args.target, primary_agent, args)
+        # The request paths log every step with print(); keep the report readable unless asked
+        with (nullcontext() if args.verbose else redirect_stdout(io.StringIO())):
+            if args.warmup:
+                await run_load(target, args.warmup, min(args.concurrency, args.warmup))
+            report = await run_load(target, args.requests, args.concurrency)
+
+    from mcp_tool_cache import all_tool_list_stats
+    cache_stats = all_tool_list_stats().values()
+    report["tool_list_cache"] = {
+        "fetches": sum(stats.fetches for stats in cache_stats),
+        "hits": sum(stats.hits for stats in cache_stats),
+        "saved_ms": round(sum(stats.saved_seconds for stats in cache_stats) * 1000, 1),
+    }
+    report["target"] = args.target
+    report["config"] = {
+        "llm_latency_ms": args.llm_latency_ms, "mcp_latency_ms": args.mcp_latency_ms,
+        "supabase_latency_ms": args.supabase_latency_ms, "payload_bytes": args.payload_bytes,
+        "orchestrator_tools": args.orchestrator_tools, "sub_agent_tool_calls": args.sub_agent_tool_calls,
+    }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    lat, lag = report["latency_ms"], report["loop_lag_ms"]
+    print(f"target={report['target']} requests={report['requests']} concurrency={report['concurrency']}")
+    print(f"  completed   {report['completed']} ({report['errors']} errors) in {report['elapsed_s']}s")
+    print(f"  throughput  {report['throughput_rps']} req/s")
+    print(f"  latency     p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  max {lat['max']}ms")
+    print(f"  loop lag    p50 {lag['p50']}ms  p99 {lag['p99']}ms  max {lag['max']}ms")
+    cache = report["tool_list_cache"]
+    print(f"  tool lists  {cache['fetches']} fetched, {cache['hits']} served from cache (~{cache['saved_ms']}ms saved)")
+    for error in report["error_samples"]:
+        print(f"  error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["api", "bolt", "slack-events"], default="api")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5, help="Requests to run before measuring")
+    parser.add_argument("--sessions", type=int, default=10, help="Distinct conversation sessions to spread requests over")
+    parser.add_argument("--services", type=int, default=6, help="How many registry services to start (as stubs)")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--orchestrator-tools", default="*",
+                        help="Comma-separated tools the orchestrator calls per request ('*' = next service); empty for none")
+    parser.add_argument("--sub-agent-tool-calls", type=int, default=1, help="MCP tool calls per sub-agent run")
+    parser.add_argument("--mcp-latency-ms", type=float, default=50.0)
+    parser.add_argument("--payload-bytes", type=int, default=2000, help="Size of each MCP tool result")
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0, help="Blocking latency per Supabase call")
+    parser.add_argument("--slack-latency-ms", type=float, default=50.0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application's own logging")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Cold-start benchmark for the MCP servers defined in services.yaml.
+
+For each server, spawns the process, performs the MCP `initialize` handshake and
+a `tools/list` request over stdio, and reports how long each step took. Use
+`--compare-npx` to also time the old `npx` launch path.
+
+Usage:
+    python benchmarks/mcp_startup.py [--runs 3] [--compare-npx] [server ...]
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mcp_servers import MCPServerSpec, resolve_command
+from service_registry import load_services
+
+PROTOCOL_VERSION = "2024-11-05"
+
+
+async def _send(proc: asyncio.subprocess.Process, message: dict) -> None:
+    proc.stdin.write((json.dumps(message) + "\n").encode())
+    await proc.stdin.drain()
+
+
+async def _wait_for_response(proc: asyncio.subprocess.Process, request_id: int) -> dict:
+    while True:
+        line = await proc.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited before responding")
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue  # Some servers log to stdout before the transport is up
+        if message.get("id") == request_id:
+            return message
+
+
+async def time_server(spec: MCPServerSpec, use_npx: bool, timeout: float) -> Dict[str, float]:
+    """Launch one server and return timings (in seconds) for spawn, initialize and tools/list."""
+    command, args = resolve_command(spec, use_npx=use_npx)
+    env = {**os.environ, **spec.resolve_env()}
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        command, *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+    )
+    spawned = time.perf_counter()
+    try:
+        await _send(proc, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "mcp-startup-benchmark", "version": "1.0.0"},
+            },
+        })
+        await asyncio.wait_for(_wait_for_response(proc, 1), timeout)
+        initialized = time.perf_counter()
+        await _send(proc, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        await _send(proc, {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}})
+        await asyncio.wait_for(_wait_for_response(proc, 2), timeout)
+        listed = time.perf_counter()
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+
+    return {
+        "spawn": spawned - start,
+        "initialize": initialized - start,
+        "tools_list": listed - initialized,
+    }
+
+
+async def benchmark(specs: Dict[str, MCPServerSpec], runs: int, compare_npx: bool, timeout: float) -> List[dict]:
+    modes = [False, True] if compare_npx else [False]
+    rows = []
+    for name, spec in specs.items():
+        for use_npx in modes:
+            samples: List[Dict[str, float]] = []
+            error: Optional[str] = None
+            for _ in range(runs):
+                try:
+                    samples.append(await time_server(spec, use_npx, timeout))
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    break
+            row = {"server": name, "launcher": "npx" if use_npx else "direct", "runs": len(samples)}
+            if samples:
+                for key in ("initialize", "tools_list"):
+                    row[f"{key}_median_ms"] = round(statistics.median(s[key] for s in samples) * 1000, 1)
+                    row[f"{key}_max_ms"] = round(max(s[key] for s in samples) * 1000, 1)
+            if error:
+                row["error"] = error
+            rows.append(row)
+    return rows
+
+
+def print_report(rows: List[dict]) -> None:
+    header = f"{'server':<12} {'launcher':<8} {'runs':>4} {'init p50':>10} {'init max':>10} {'list p50':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        if "initialize_median_ms" in row:
+            print(f"{row['server']:<12} {row['launcher']:<8} {row['runs']:>4} "
+                  f"{row['initialize_median_ms']:>8.1f}ms {row['initialize_max_ms']:>8.1f}ms "
+                  f"{row['tools_list_median_ms']:>8.1f}ms")
+        else:
+            print(f"{row['server']:<12} {row['launcher']:<8} {row['runs']:>4}   {row.get('error', 'failed')}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("servers", nargs="*", help="Servers to benchmark (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per server and launcher")
+    parser.add_argument("--compare-npx", action="store_true", help="Also time launching through npx")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-step timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    available = {service.name: service.server for service in load_services(include_disabled=True)}
+    names = args.servers or list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        parser.error(f"unknown server(s): {', '.join(unknown)}")
+
+    specs = {name: available[name] for name in names}
+    rows = asyncio.run(benchmark(specs, args.runs, args.compare_npx, args.timeout))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
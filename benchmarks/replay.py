@@ -0,0 +1,296 @@
+"""
+Replay a recorded request offline.
+
+Recordings are written per request_id when AGENT_RECORD_DIR is set (see
+recording.py). Replaying one runs the real orchestrator, sub-agents, request
+limits and usage accounting, but every model response and MCP tool result is
+served from the recording after the recorded delay multiplied by --time-scale.
+Runs are deterministic and need no network access, API keys or MCP servers, so
+they can be used as performance regression tests:
+
+    --time-scale 1   reproduces the original timings (end-to-end behaviour)
+    --time-scale 0   removes all model and tool latency, leaving only our own overhead
+
+If the code under test asks for something the recording doesn't have (a model
+request beyond the recorded ones, or a tool call that wasn't made), a placeholder
+is returned and counted as a mismatch.
+
+Usage:
+    python benchmarks/replay.py recordings/<request_id>.jsonl --time-scale 0 --repeat 20
+    python benchmarks/replay.py recordings/<request_id>.jsonl --profile
+"""
+from __future__ import annotations
+from collections import defaultdict, deque
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext, redirect_stdout
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mcp import types
+from pydantic_ai.mcp import MCPServer
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.tools import ToolDefinition
+from pydantic_ai.usage import Usage
+
+from recording import load_recording
+from request_limits import current_agent
+from service_registry import ServiceConfig, load_services
+
+ORCHESTRATOR = "orchestrator"
+
+
+# ========== Recorded traffic ==========
+
+@dataclass
+class Replay:
+    """Recorded model responses and MCP results, consumed in order as the replay asks for them."""
+    events: List[Dict[str, Any]]
+    time_scale: float = 1.0
+    model_responses: Dict[str, Deque[Dict[str, Any]]] = field(default_factory=lambda: defaultdict(deque))
+    tool_results: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = field(default_factory=lambda: defaultdict(deque))
+    tool_lists: Dict[str, List[ToolDefinition]] = field(default_factory=dict)
+    model_calls: int = 0
+    mcp_calls: int = 0
+    mismatches: List[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        for event in self.events:
+            if event["event"] == "model":
+                self.model_responses[event["agent"]].append(event)
+                # Sub-agents only see their MCP server's tools; use them if the tools/list call wasn't recorded
+                if event.get("tools") and event["agent"] != ORCHESTRATOR:
+                    self.tool_lists.setdefault(event["agent"], [ToolDefinition(**tool) for tool in event["tools"]])
+            elif event["event"] == "mcp" and event["method"] == "tools/call":
+                self.tool_results[(event["server"], event["params"]["name"])].append(event)
+            elif event["event"] == "mcp" and event["method"] == "tools/list":
+                self.tool_lists[event["server"]] = [ToolDefinition(**tool) for tool in event["result"]]
+
+    async def wait(self, event: Dict[str, Any]) -> None:
+        if self.time_scale:
+            await asyncio.sleep(event["duration"] * self.time_scale)
+
+    def orchestrator_input(self) -> Tuple[str, List[ModelMessage]]:
+        """The user prompt and message history of the recorded orchestrator run."""
+        first = next(
+            (e for e in self.events if e["event"] == "model" and e["agent"] == ORCHESTRATOR and e["full_input"]), None
+        )
+        if first is None:
+            raise SystemExit("Recording has no orchestrator model request to start from.")
+        messages = ModelMessagesTypeAdapter.validate_python(first["messages"])
+        prompt = next(part.content for part in messages[-1].parts if isinstance(part, UserPromptPart))
+        return prompt, messages[:-1]
+
+    def recorded_answer(self) -> str:
+        responses = [e for e in self.events if e["event"] == "model" and e["agent"] == ORCHESTRATOR]
+        if not responses:
+            return ""
+        return "".join(part.get("content", "") for part in responses[-1]["response"]["parts"] if part["part_kind"] == "text")
+
+    def recorded_seconds(self) -> float:
+        start = min(event["ts"] - event.get("duration", 0) for event in self.events)
+        return max(event["ts"] for event in self.events) - start
+
+    def agent_names(self) -> set:
+        return {event["agent"] for event in self.events}
+
+    def unused(self) -> int:
+        return sum(map(len, self.model_responses.values())) + sum(map(len, self.tool_results.values()))
+
+
+class ReplayModel(Model):
+    """Answers each agent's model requests with that agent's recorded responses, in order."""
+
+    def __init__(self, replay: Replay):
+        self.replay = replay
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> Tuple[ModelResponse, Usage]:
+        agent, _ = current_agent()
+        queue = self.replay.model_responses.get(agent)
+        if not queue:
+            self.replay.mismatches.append(f"{agent}: unrecorded model request")
+            return ModelResponse(parts=[TextPart(content="[replay: no recorded response]")], model_name=self.model_name), Usage()
+        event = queue.popleft()
+        await self.replay.wait(event)
+        self.replay.model_calls += 1
+        response = ModelMessagesTypeAdapter.validate_python([event["response"]])[0]
+        return response, Usage(**event["usage"])
+
+    @property
+    def model_name(self) -> str:
+        return "replay"
+
+    @property
+    def system(self) -> str:
+        return "replay"
+
+
+class ReplayMCPServer(MCPServer):
+    """Serves a server's recorded tool list and tool results without starting anything."""
+
+    def __init__(self, name: str, replay: Replay):
+        self.name = name
+        self.replay = replay
+
+    @asynccontextmanager
+    async def client_streams(self) -> AsyncIterator[Any]:
+        raise NotImplementedError("Replayed servers have no transport.")
+        yield
+
+    async def __aenter__(self) -> "ReplayMCPServer":
+        self.is_running = True
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.is_running = False
+
+    async def list_tools(self) -> List[ToolDefinition]:
+        return self.replay.tool_lists.get(self.name, [])
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> types.CallToolResult:
+        queue = self.replay.tool_results.get((self.name, tool_name))
+        if not queue:
+            self.replay.mismatches.append(f"{self.name}: unrecorded call to {tool_name}")
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text="[replay: no recorded result]")], isError=True
+            )
+        event = queue.popleft()
+        await self.replay.wait(event)
+        self.replay.mcp_calls += 1
+        return types.CallToolResult.model_validate(event["result"])
+
+
+# ========== Replay run ==========
+
+def recorded_services(replay: Replay) -> List[ServiceConfig]:
+    """Registry services that took part in the recording, enabled whatever services.yaml says."""
+    names = replay.agent_names()
+    return [replace(service, enabled=True) for service in load_services(include_disabled=True) if service.name in names]
+
+
+async def replay_once(events: List[Dict[str, Any]], time_scale: float, deadline: Optional[float]) -> Dict[str, Any]:
+    from mcp_agent_army import build_mcp_agent_army
+    from request_limits import bound_request, run_bounded
+    from usage_accounting import track_request, usage_limits
+
+    replay = Replay(events, time_scale=time_scale)
+    prompt, message_history = replay.orchestrator_input()
+    model = ReplayModel(replay)
+    primary_agent, sub_agents = build_mcp_agent_army(
+        recorded_services(replay),
+        model_factory=lambda tier: model,
+        server_factory=lambda spec: ReplayMCPServer(spec.name, replay),
+    )
+    first = events[0]
+    async with AsyncExitStack() as stack:
+        for sub_agent in sub_agents.values():
+            await stack.enter_async_context(sub_agent.agent.run_mcp_servers())
+        start = time.perf_counter()
+        with track_request(f"{first['request_id']}-replay", first["session_id"], source="replay") as usage, \
+                bound_request(deadline):
+            result = await run_bounded(primary_agent, prompt, message_history=message_history, usage_limits=usage_limits())
+        elapsed = time.perf_counter() - start
+
+    return {
+        "replay_ms": round(elapsed * 1000, 1),
+        "model_calls": replay.model_calls,
+        "mcp_calls": replay.mcp_calls,
+        "unused": replay.unused(),
+        "mismatches": replay.mismatches,
+        "partial": getattr(result, "partial", False),
+        "answer_matches": str(result.data) == replay.recorded_answer(),
+        "total_tokens": usage.total_tokens,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    events = load_recording(args.recording)
+    if not events:
+        raise SystemExit(f"{args.recording} is empty.")
+    recorded = Replay(events)
+    runs = []
+    # The request paths log every step with print(); keep the report readable unless asked
+    with (nullcontext() if args.verbose else redirect_stdout(io.StringIO())):
+        for _ in range(args.repeat):
+            runs.append(await replay_once(events, args.time_scale, args.deadline))
+
+    timings = [run["replay_ms"] for run in runs]
+    last = runs[-1]
+    return {
+        "recording": str(args.recording),
+        "request_id": events[0]["request_id"],
+        "time_scale": args.time_scale,
+        "runs": len(runs),
+        "recorded_ms": round(recorded.recorded_seconds() * 1000, 1),
+        "replay_ms": {"min": min(timings), "median": round(statistics.median(timings), 1), "max": max(timings)},
+        "model_calls": {"recorded": sum(map(len, recorded.model_responses.values())), "served": last["model_calls"]},
+        "mcp_calls": {"recorded": sum(map(len, recorded.tool_results.values())), "served": last["mcp_calls"]},
+        "unused": last["unused"],
+        "mismatches": sorted({m for run in runs for m in run["mismatches"]}),
+        "partial": any(run["partial"] for run in runs),
+        "answer_matches": all(run["answer_matches"] for run in runs),
+        "total_tokens": last["total_tokens"],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    timing = report["replay_ms"]
+    print(f"recording={report['recording']} request_id={report['request_id']} time_scale={report['time_scale']}")
+    print(f"  recorded    {report['recorded_ms']}ms")
+    print(f"  replayed    min {timing['min']}ms  median {timing['median']}ms  max {timing['max']}ms over {report['runs']} runs")
+    print(f"  model calls {report['model_calls']['served']}/{report['model_calls']['recorded']} served")
+    print(f"  mcp calls   {report['mcp_calls']['served']}/{report['mcp_calls']['recorded']} served")
+    print(f"  answer      {'matches the recording' if report['answer_matches'] else 'differs from the recording'}"
+          f"{' (partial)' if report['partial'] else ''}")
+    for mismatch in report["mismatches"]:
+        print(f"  mismatch: {mismatch}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", type=Path, help="A <request_id>.jsonl file written under AGENT_RECORD_DIR")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier for recorded model and tool latencies")
+    parser.add_argument("--repeat", type=int, default=1, help="How many times to replay the request")
+    parser.add_argument("--deadline", type=float, default=None, help="Request deadline in seconds (default: REQUEST_DEADLINE_SECONDS)")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and print the top functions by cumulative time")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application's own logging")
+    args = parser.parse_args()
+    # Never record the replay over the recording it reads
+    os.environ.pop("AGENT_RECORD_DIR", None)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report = asyncio.run(main_async(args))
+    if profiler:
+        profiler.disable()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
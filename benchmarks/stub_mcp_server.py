@@ -0,0 +1,44 @@
+"""
+Stub MCP stdio server for offline benchmarks.
+
+Exposes a couple of generic tools that sleep for a configurable time and return
+a payload of configurable size, so sub-agents can be exercised without Node,
+API keys or network access.
+
+Configuration (environment):
+    STUB_MCP_LATENCY_MS     Delay per tool call (default: 50)
+    STUB_MCP_PAYLOAD_BYTES  Size of each tool result (default: 2000)
+"""
+from __future__ import annotations
+import asyncio
+import os
+
+from mcp.server.fastmcp import FastMCP
+
+LATENCY_S = float(os.getenv("STUB_MCP_LATENCY_MS", "50")) / 1000
+PAYLOAD_BYTES = int(os.getenv("STUB_MCP_PAYLOAD_BYTES", "2000"))
+
+mcp = FastMCP("stub-mcp-server", log_level="WARNING")
+
+
+def _payload(prefix: str) -> str:
+    line = f"{prefix}: lorem ipsum dolor sit amet, consectetur adipiscing elit.\n"
+    return (line * (PAYLOAD_BYTES // len(line) + 1))[:PAYLOAD_BYTES]
+
+
+@mcp.tool()
+async def search(query: str) -> str:
+    """Search for information matching a query."""
+    await asyncio.sleep(LATENCY_S)
+    return _payload(f"result for {query!r}")
+
+
+@mcp.tool()
+async def fetch(resource: str) -> str:
+    """Fetch a resource by name or URL."""
+    await asyncio.sleep(LATENCY_S)
+    return _payload(f"content of {resource!r}")
+
+
+if __name__ == "__main__":
+    mcp.run()
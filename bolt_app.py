@@ -1,39 +1,22 @@
 import os
-import asyncio
-import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 from slack_bolt.async_app import AsyncApp
-# Use the FastAPI adapter for Socket Mode to run both
-from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
-from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-from dotenv import load_dotenv
-from fastapi import FastAPI, Request # Import FastAPI and Request for integration
 
-# Import shared utilities and agent logic
+# Import shared utilities
+from request_limits import bound_request, run_bounded
+from slack_delivery import get_delivery_queue, reply_thread_ts
 from supabase_utils import fetch_conversation_history, store_message
-# Import the FastAPI app instance AND the agent initialization function
-from mcp_agent_army_endpoint import app as fastapi_app, lifespan # Import FastAPI app and lifespan
-from mcp_agent_army import get_mcp_agent_army # Still need this for lifespan
-from pydantic_ai.messages import ModelRequest, ModelResponse, UserPromptPart, TextPart
+from usage_accounting import track_request
 
-# Load environment variables
-load_dotenv()
-
-SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
-SLACK_APP_TOKEN = os.environ.get("SLACK_APP_TOKEN") # Socket Mode requires an App Token
-SLACK_BOT_USER_ID = os.environ.get("SLACK_BOT_USER_ID")
-
-if not SLACK_BOT_TOKEN or not SLACK_APP_TOKEN:
-    print("Error: SLACK_BOT_TOKEN or SLACK_APP_TOKEN environment variables not set.")
-    exit(1)
-
-# Initialize Bolt App BEFORE FastAPI lifespan modifies its state
-bolt_app = AsyncApp(token=SLACK_BOT_TOKEN)
 
 # --- Event Handler for Messages ---
-# Use bolt_app decorator
-@bolt_app.message("") # Listen to all messages (DMs, channels, mentions if subscribed)
-async def handle_message(message, say, context): # Use context to potentially access shared state later if needed
-    """Handles incoming user messages."""
+async def handle_message(message: Dict[str, Any], say: Callable[..., Awaitable[Any]], get_agent: Callable[[], Optional[Any]]):
+    """
+    Handles incoming user messages.
+
+    Registered on the Bolt app by create_bolt_app; kept at module level so it can be
+    driven directly (e.g. by the benchmark harness) without a Slack connection.
+    """
     # Acknowledge Slack immediately to prevent timeouts/retries (implicit in Bolt?)
     # await ack() # Bolt might handle basic ack automatically for messages
 
@@ -47,7 +30,7 @@ async def handle_message(message, say, context): # Use context to potentially ac
     print(f"Bolt received message from user {event_user} in channel {channel}: '{text}'")
 
     # Ignore messages from the bot itself or without a user
-    if not event_user or event_user == SLACK_BOT_USER_ID:
+    if not event_user or event_user == os.environ.get("SLACK_BOT_USER_ID"):
         print("Ignoring message from bot or without user.")
         return
 
@@ -70,21 +53,16 @@ async def handle_message(message, say, context): # Use context to potentially ac
     # --- End Quick Response Logic ---
 
     # --- Full Agent Processing ---
-    # Access the agent stored in FastAPI app state via context if possible,
-    # or fall back to a globally initialized one (less ideal but simpler for now)
-    # This part needs careful handling of shared state between FastAPI lifespan and Bolt handlers.
-    # For simplicity now, we might re-use the global approach temporarily,
-    # acknowledging it's not ideal. Let's assume lifespan populates fastapi_app.state.primary_agent
-    # How Bolt gets access needs clarification - maybe pass fastapi_app instance?
-
-    # TEMPORARY: Relying on lifespan to set agent in fastapi_app.state
-    # This handler needs access to that state. Bolt's default context might not have it.
-    # Let's try accessing it directly via the imported fastapi_app instance for now.
-    if not hasattr(fastapi_app.state, 'primary_agent') or fastapi_app.state.primary_agent is None:
+    # The agent lives in FastAPI app state; the caller hands us an accessor for it.
+    agent_instance = get_agent()
+    if agent_instance is None:
         print("Error: Primary agent not found in FastAPI app state.")
         await say(text="Sorry, my brain isn't working right now (agent state issue). Please try again later.")
         return
 
+    from mcp_agent_army import PRIMARY_SYSTEM_PROMPT
+    from prompt_cache import build_message_history
+
     try:
         # Fetch history
         print(f"Fetching history for session_id: {session_id} (Bolt)")
@@ -92,16 +70,7 @@ async def handle_message(message, say, context): # Use context to potentially ac
         print(f"Fetched {len(conversation_history)} messages (Bolt).")
 
         # Convert history
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = msg_data["type"]
-            msg_content = msg_data["content"]
-            if isinstance(msg_content, str):
-                 msg_obj = ModelRequest(parts=[UserPromptPart(content=msg_content)]) if msg_type == "human" else ModelResponse(parts=[TextPart(content=msg_content)])
-                 messages.append(msg_obj)
-            else:
-                 print(f"Warning: Skipping message with non-string content: {msg_content}")
+        messages = build_message_history(conversation_history, PRIMARY_SYSTEM_PROMPT)
 
         # Store incoming message
         print(f"Storing user message for session_id: {session_id} (Bolt)")
@@ -109,13 +78,13 @@ async def handle_message(message, say, context): # Use context to potentially ac
 
         # Run the agent
         print(f"Running primary agent for query: '{text}' (Bolt)")
-        agent_instance = fastapi_app.state.primary_agent # Get from state
-        result = await agent_instance.run(text, message_history=messages)
+        with track_request(request_id, session_id, source="bolt", channel=message.get("channel")) as usage, bound_request():
+            result = await run_bounded(agent_instance, text, message_history=messages, usage_limits=usage.usage_limits())
         response_text = result.data if hasattr(result, "data") else str(result)
         print(f"Agent returned response: '{response_text}' (Bolt)")
 
         # Store agent response
-        await store_message(session_id=session_id, message_type="ai", content=response_text, data={"request_id": request_id})
+        await store_message(session_id=session_id, message_type="ai", content=response_text, data={"request_id": request_id, "usage": usage.summary()})
 
         # Send response back using Bolt's say function
         await say(text=response_text)
@@ -129,17 +98,30 @@ async def handle_message(message, say, context): # Use context to potentially ac
             print(f"Failed to send error message via Bolt: {say_err}")
 
 
-# --- Main execution ---
-# We won't run Bolt standalone. FastAPI will run via Uvicorn,
-# and the lifespan manager will initialize the agent.
-# We need to ensure the Socket Mode handler runs alongside FastAPI.
+def create_bolt_app(get_agent: Callable[[], Optional[Any]], token: Optional[str] = None) -> AsyncApp:
+    """
+    Create the Bolt app and register its event handlers.
+
+    Args:
+        get_agent: Returns the primary agent initialized by the FastAPI lifespan, or None if it isn't ready.
+        token: Slack bot token. Defaults to SLACK_BOT_TOKEN.
+
+    Returns:
+        The configured AsyncApp, ready to be passed to a Socket Mode handler.
+    """
+    bolt_app = AsyncApp(token=token or os.environ.get("SLACK_BOT_TOKEN"))
+    # One queue for the app: Bolt hands each event a fresh client, and per-channel
+    # pacing only works if every reply goes through the same queue
+    delivery = get_delivery_queue(bolt_app.client)
+
+    @bolt_app.message("") # Listen to all messages (DMs, channels, mentions if subscribed)
+    async def on_message(message):
+        # Replies go through the delivery queue so the handler never waits on Slack I/O
+        thread_ts = reply_thread_ts(message)
 
-# One way is to start the Socket Mode handler in a background task
-# within the FastAPI lifespan startup.
+        async def say(text: str):
+            delivery.send(message.get("channel"), text, thread_ts=thread_ts)
 
-# Modify FastAPI lifespan in mcp_agent_army_endpoint.py instead.
-# This bolt_app.py file now only defines the Bolt app and its handlers.
+        await handle_message(message, say, get_agent)
 
-# Remove the standalone main execution block
-# async def main(): ...
-# if __name__ == "__main__": ...
+    return bolt_app
@@ -1,26 +1,34 @@
 from __future__ import annotations
 from contextlib import AsyncExitStack
-from typing import Any, Dict, List
-from dataclasses import dataclass
-from dotenv import load_dotenv
-from rich.markdown import Markdown
-from rich.console import Console
-from rich.live import Live
-import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
 import os
 
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.models.gemini import GeminiModel # Re-add GeminiModel import
-from pydantic_ai.mcp import MCPServerStdio
-from pydantic_ai import Agent, RunContext
+from mcp_servers import MCPServerSpec, create_mcp_server
+from request_limits import record_completed, run_bounded
+from result_guard import RETRIEVE_TOOL_NAME, guard_result, retrieve_full_result
+from service_registry import ServiceConfig, load_services
+from usage_accounting import usage_limits
 
-load_dotenv()
+# pydantic_ai and the provider SDKs are imported where they are used, so importing
+# this module stays cheap. Environment variables are loaded by the application factory.
+if TYPE_CHECKING:
+    from pydantic_ai import Agent, Tool
 
 # ========== Helper function to get model configuration ==========
-def get_model():
+@lru_cache(maxsize=None)
+def get_model(tier: str = 'default'):
+    """
+    Build the model for a model tier. Models are cached per tier and shared between agents.
+
+    The `default` tier uses MODEL_CHOICE; any other tier reads MODEL_CHOICE_<TIER>
+    and falls back to MODEL_CHOICE.
+    """
     provider_name = os.getenv('PROVIDER', 'Gemini').lower() # Default to Gemini
-    llm = os.getenv('MODEL_CHOICE')
+    llm = None
+    if tier != 'default':
+        llm = os.getenv(f'MODEL_CHOICE_{tier.upper()}')
+    llm = llm or os.getenv('MODEL_CHOICE')
 
     if not llm:
         # Set default model based on provider if not specified
@@ -39,7 +47,10 @@ def get_model():
         if not os.getenv('GEMINI_API_KEY'):
              print("Warning: GEMINI_API_KEY not found in environment variables. Ensure it's set for GeminiModel.")
         # Assuming 'google-gla' is the correct provider string for the standard Gemini API
-        return GeminiModel(llm, provider='google-gla')
+        from pydantic_ai.models.gemini import GeminiModel
+        from prompt_cache import PrefixCachingModel
+        from recording import with_recording
+        return with_recording(PrefixCachingModel(GeminiModel(llm, provider='google-gla')))
 
     elif provider_name == 'openai' or provider_name == 'groq':
         base_url = os.getenv('BASE_URL')
@@ -64,233 +75,139 @@ def get_model():
             api_key = 'no-api-key-provided'
 
         print(f"Using OpenAI compatible provider ({provider_name}) with model: {llm} at base_url: {base_url}")
-        return OpenAIModel(llm, provider=OpenAIProvider(base_url=base_url, api_key=api_key))
+        from pydantic_ai.models.openai import OpenAIModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+        from prompt_cache import PrefixCachingModel
+        from recording import with_recording
+        return with_recording(PrefixCachingModel(OpenAIModel(llm, provider=OpenAIProvider(base_url=base_url, api_key=api_key))))
 
     else:
         raise ValueError(f"Unsupported PROVIDER: {provider_name}. Supported providers are OpenAI, Gemini, Groq.")
 
-# ========== Set up MCP servers for each service ==========
-
-# Airtable MCP server
-airtable_server = MCPServerStdio(
-    'npx', ['airtable-mcp-server'], # Removed -y, package name is arg
-    env={"AIRTABLE_API_KEY": os.getenv("AIRTABLE_API_KEY")}
-)
-
-# Brave Search MCP server
-brave_server = MCPServerStdio(
-    'npx', ['@modelcontextprotocol/server-brave-search'], # Removed -y
-    env={"BRAVE_API_KEY": os.getenv("BRAVE_API_KEY")}
-)
-
-# Filesystem MCP server
-# Note: LOCAL_FILE_DIR needs to be valid within the container
-filesystem_server = MCPServerStdio(
-    'npx', ['@modelcontextprotocol/server-filesystem', os.getenv("LOCAL_FILE_DIR", "/app/local_files")], # Use /app/local_files as default
-    env={} # No specific env needed for filesystem server itself
-)
-
-# GitHub MCP server
-github_server = MCPServerStdio(
-    'npx', ['@modelcontextprotocol/server-github'], # Removed -y
-    env={"GITHUB_PERSONAL_ACCESS_TOKEN": os.getenv("GITHUB_TOKEN")}
-)
-
-# Slack MCP server
-slack_server = MCPServerStdio(
-    'npx', ['@modelcontextprotocol/server-slack'], # Removed -y
-    env={
-        "SLACK_BOT_TOKEN": os.getenv("SLACK_BOT_TOKEN"),
-        "SLACK_TEAM_ID": os.getenv("SLACK_TEAM_ID")
-    }
-)
-
-# Firecrawl MCP server
-firecrawl_server = MCPServerStdio(
-    'npx', ['firecrawl-mcp'], # Removed -y
-    env={"FIRECRAWL_API_KEY": os.getenv("FIRECRAWL_API_KEY")}
-)
-
-# ========== Create subagents with their MCP servers ==========
-
-# Airtable agent
-airtable_agent = Agent(
-    get_model(),
-    system_prompt="You are an Airtable specialist. Help users interact with Airtable databases.",
-    mcp_servers=[airtable_server]
-)
-
-# Brave search agent
-brave_agent = Agent(
-    get_model(),
-    system_prompt="You are a web search specialist using Brave Search. Find relevant information on the web.",
-    mcp_servers=[brave_server]
-)
-
-# Filesystem agent
-filesystem_agent = Agent(
-    get_model(),
-    system_prompt="You are a filesystem specialist. Help users manage their files and directories.",
-    mcp_servers=[filesystem_server]
-)
-
-# GitHub agent
-github_agent = Agent(
-    get_model(),
-    system_prompt="You are a GitHub specialist. Help users interact with GitHub repositories and features.",
-    mcp_servers=[github_server]
-)
-
-# Slack agent
-slack_agent = Agent(
-    get_model(),
-    system_prompt="You are a Slack specialist. Help users interact with Slack workspaces and channels.",
-    mcp_servers=[slack_server]
-)
-
-# Firecrawl agent
-firecrawl_agent = Agent(
-    get_model(),
-    system_prompt="You are a web crawling specialist. Help users extract data from websites.",
-    mcp_servers=[firecrawl_server]
-)
-
-# ========== Create the primary orchestration agent ==========
-primary_agent = Agent(
-    get_model(),
-    system_prompt="""You are a primary orchestration agent that can call upon specialized subagents
+PRIMARY_SYSTEM_PROMPT = """You are a primary orchestration agent that can call upon specialized subagents
     to perform various tasks. Each subagent is an expert in interacting with a specific third-party service.
     Analyze the user request and delegate the work to the appropriate subagent.
 
     IMPORTANT: When processing a request originating from a Slack event handler, your final output should be ONLY the text content of the response intended for the user. The handler itself will send this text back to the appropriate Slack channel. Do NOT use the slack_agent tool to send the final response in this context. Only use the slack_agent if the user's request is specifically asking you to perform a distinct action within Slack (e.g., 'send a message to #general', 'find user X')."""
-)
-
-# ========== Define tools for the primary agent to call subagents ==========
-
-@primary_agent.tool_plain
-async def use_airtable_agent(query: str) -> dict[str, str]:
-    """
-    Access and manipulate Airtable data through the Airtable subagent.
-    Use this tool when the user needs to fetch, modify, or analyze data in Airtable.
-
-    Args:
-        ctx: The run context.
-        query: The instruction for the Airtable agent.
 
-    Returns:
-        The response from the Airtable agent.
-    """
-    print(f"Calling Airtable agent with query: {query}")
-    result = await airtable_agent.run(query)
-    return {"result": result.data}
+# ========== Sub-agents generated from the service registry ==========
 
-@primary_agent.tool_plain
-async def use_brave_search_agent(query: str) -> dict[str, str]:
+class SubAgent:
     """
-    Search the web using Brave Search through the Brave subagent.
-    Use this tool when the user needs to find information on the internet or research a topic.
+    A sub-agent and its MCP server, built from a service definition on first use.
 
-    Args:
-        ctx: The run context.
-        query: The search query or instruction for the Brave search agent.
-
-    Returns:
-        The search results or response from the Brave agent.
+    Nothing is created until `agent` is accessed, so services that are never
+    started cost no model clients or server processes.
     """
-    print(f"Calling Brave agent with query: {query}")
-    result = await brave_agent.run(query)
-    return {"result": result.data}
 
-@primary_agent.tool_plain
-async def use_filesystem_agent(query: str) -> dict[str, str]:
+    def __init__(
+        self,
+        service: ServiceConfig,
+        model_factory: Callable[[str], Any] = None,
+        server_factory: Callable[[MCPServerSpec], Any] = None,
+    ):
+        self.service = service
+        self._model_factory = model_factory or get_model
+        self._server_factory = server_factory or create_mcp_server
+        self._agent: Optional[Agent] = None
+
+    @property
+    def agent(self) -> Agent:
+        if self._agent is None:
+            from pydantic_ai import Agent
+            server = self._server_factory(self.service.server)
+            self._agent = Agent(
+                self._model_factory(self.service.model_tier),
+                system_prompt=self.service.system_prompt,
+                mcp_servers=[server]
+            )
+        return self._agent
+
+    async def run(self, query: str) -> Any:
+        from mcp_tool_cache import tool_list_stats
+        stats = tool_list_stats(self.service.name)
+        hits, saved = stats.hits, stats.saved_seconds
+        # Runs inside a tracked request share its token budget, deadline and tool-call limit
+        result = await run_bounded(self.agent, query, name=self.service.name, usage_limits=usage_limits())
+        if stats.hits > hits:
+            print(f"{self.service.name} agent: tool list served from cache {stats.hits - hits} times, "
+                  f"saved ~{(stats.saved_seconds - saved) * 1000:.1f}ms")
+        return result
+
+    def as_tool(self) -> Tool:
+        """Create the orchestrator tool that delegates to this sub-agent."""
+        from pydantic_ai import Tool
+        sub_agent = self
+
+        async def use_service_agent(query: str) -> dict[str, Any]:
+            """
+            Args:
+                query: The instruction for the subagent.
+            """
+            print(f"Calling {sub_agent.service.name} agent with query: {query}")
+            result = await sub_agent.run(query)
+            # Oversized results are compacted here; the full payload stays retrievable by handle
+            guarded = guard_result(result.data, sub_agent.service.max_result_bytes, sub_agent.service.max_result_tokens)
+            if not getattr(result, "partial", False):
+                record_completed(sub_agent.service.name, guarded["result"])
+            return guarded
+
+        return Tool(use_service_agent, takes_ctx=False, name=self.service.tool_name, description=self.service.description)
+
+
+def build_mcp_agent_army(
+    services: Optional[List[ServiceConfig]] = None,
+    model_factory: Callable[[str], Any] = None,
+    server_factory: Callable[[MCPServerSpec], Any] = None,
+) -> Tuple[Agent, Dict[str, SubAgent]]:
     """
-    Interact with the file system through the filesystem subagent.
-    Use this tool when the user needs to read, write, list, or modify files.
+    Build the primary orchestration agent with one tool per enabled service.
 
     Args:
-        ctx: The run context.
-        query: The instruction for the filesystem agent.
+        services: Services to expose. Defaults to the enabled services in services.yaml.
+        model_factory: Callable mapping a model tier to a model. Defaults to get_model.
+        server_factory: Callable mapping a server definition to an MCP server. Defaults to create_mcp_server.
 
     Returns:
-        The response from the filesystem agent.
-    """
-    print(f"Calling Filesystem agent with query: {query}")
-    result = await filesystem_agent.run(query)
-    return {"result": result.data}
-
-@primary_agent.tool_plain
-async def use_github_agent(query: str) -> dict[str, str]:
+        tuple: (primary_agent, sub_agents) - sub_agents is keyed by service name
     """
-    Interact with GitHub through the GitHub subagent.
-    Use this tool when the user needs to access repositories, issues, PRs, or other GitHub resources.
-
-    Args:
-        ctx: The run context.
-        query: The instruction for the GitHub agent.
-
-    Returns:
-        The response from the GitHub agent.
-    """
-    print(f"Calling GitHub agent with query: {query}")
-    result = await github_agent.run(query)
-    return {"result": result.data}
-
-@primary_agent.tool_plain
-async def use_slack_agent(query: str) -> dict[str, str]:
-    """
-    Interact with Slack through the Slack subagent.
-    Use this tool when the user needs to send messages, access channels, or retrieve Slack information.
-
-    Args:
-        ctx: The run context.
-        query: The instruction for the Slack agent.
-
-    Returns:
-        The response from the Slack agent.
-    """
-    print(f"Calling Slack agent with query: {query}")
-    result = await slack_agent.run(query)
-    return {"result": result.data}
-
-@primary_agent.tool_plain
-async def use_firecrawl_agent(query: str) -> dict[str, str]:
-    """
-    Crawl and analyze websites using the Firecrawl subagent.
-    Use this tool when the user needs to extract data from websites or perform web scraping.
-
-    Args:
-        ctx: The run context.
-        query: The instruction for the Firecrawl agent.
-
-    Returns:
-        The response from the Firecrawl agent.
-    """
-    print(f"Calling Firecrawl agent with query: {query}")
-    result = await firecrawl_agent.run(query)
-    return {"result": result.data}
-
-async def get_mcp_agent_army():
+    from pydantic_ai import Agent, Tool
+    if services is None:
+        services = load_services()
+    model_factory = model_factory or get_model
+    sub_agents = {service.name: SubAgent(service, model_factory, server_factory) for service in services if service.enabled}
+    primary_agent = Agent(
+        model_factory("default"),
+        system_prompt=PRIMARY_SYSTEM_PROMPT,
+        tools=[
+            *(sub_agent.as_tool() for sub_agent in sub_agents.values()),
+            Tool(retrieve_full_result, takes_ctx=False, name=RETRIEVE_TOOL_NAME),
+        ]
+    )
+    return primary_agent, sub_agents
+
+
+async def get_mcp_agent_army(services: Optional[List[ServiceConfig]] = None):
     """
     Initialize and return the primary agent with all MCP servers running.
-    This function sets up an AsyncExitStack and starts all MCP servers,
+    This function builds the agents from the service registry, sets up an
+    AsyncExitStack and starts the MCP server of every enabled service,
     then returns the primary agent ready to use.
-    
+
     Returns:
         tuple: (primary_agent, stack) - The primary agent and the AsyncExitStack
               that must be kept alive to maintain the MCP server connections
     """
+    primary_agent, sub_agents = build_mcp_agent_army(services)
+
     # Create a new AsyncExitStack that will be returned to the caller
     stack = AsyncExitStack()
-    
-    # Start all the subagent MCP servers
-    print("Starting MCP servers...")
-    await stack.enter_async_context(airtable_agent.run_mcp_servers())
-    await stack.enter_async_context(brave_agent.run_mcp_servers())
-    await stack.enter_async_context(filesystem_agent.run_mcp_servers())
-    await stack.enter_async_context(github_agent.run_mcp_servers())
-    await stack.enter_async_context(slack_agent.run_mcp_servers())
-    await stack.enter_async_context(firecrawl_agent.run_mcp_servers())
+
+    # Start the MCP servers of the enabled services
+    print(f"Starting MCP servers for: {', '.join(sub_agents) or 'no services'}...")
+    for sub_agent in sub_agents.values():
+        await stack.enter_async_context(sub_agent.agent.run_mcp_servers())
     print("All MCP servers started successfully!")
-    
+
     # Return both the primary agent and the stack
     return primary_agent, stack
@@ -1,38 +1,71 @@
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, Request, HTTPException, Security, Depends # Import Request
+from typing import IO, List, Optional, Dict, Any
+from fastapi import APIRouter, FastAPI, Request, HTTPException, Security, Depends # Import Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
-# Supabase client is now initialized in supabase_utils
-# from supabase import create_client, Client
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from pathlib import Path
-import httpx
-import sys
 import os
 import asyncio # Import asyncio for background task
 
-# Import Bolt and SocketModeHandler
-from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-from bolt_app import app as bolt_app # Import the bolt app instance
+# --- Shared Utilities Import ---
+# Import shared Supabase functions (the client itself is created on first use)
+from request_limits import bound_request, run_bounded
+from supabase_utils import fetch_conversation_history, store_message
+from usage_accounting import get_usage_metrics, track_request
 
-from pydantic_ai.messages import (
-    ModelRequest,
-    ModelResponse,
-    UserPromptPart,
-    TextPart
-)
+# Heavy dependencies (pydantic_ai, the MCP servers, Slack Bolt, Supabase) are imported
+# and initialized inside the lifespan or on first use, never at import time, so
+# importing this module is cheap and uvicorn can bind its port straight away.
 
-from mcp_agent_army import get_mcp_agent_army
+# --- Socket Mode Ownership ---
+DEFAULT_SOCKET_MODE_LOCK_FILE = "/tmp/mcp_agent_army_socket_mode.lock"
+SOCKET_MODE_RETRY_SECONDS = 30
+
+def _try_acquire_socket_mode_lock() -> Optional[IO[str]]:
+    """Take the process-wide Socket Mode lock without blocking. Returns the open lock file, or None if held elsewhere."""
+    import fcntl
+    # "a+" rather than "w": opening must not erase the owner's pid on every standby retry
+    lock_file = open(os.getenv("SOCKET_MODE_LOCK_FILE", DEFAULT_SOCKET_MODE_LOCK_FILE), "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
 
-# Load environment variables
-load_dotenv()
+async def _run_socket_mode(app: FastAPI, app_token: str):
+    """Run the Bolt Socket Mode handler in this worker once it owns the Socket Mode lock."""
+    lock_file = _try_acquire_socket_mode_lock()
+    if lock_file is None:
+        print(f"Lifespan: Socket Mode is owned by another worker; this worker (pid {os.getpid()}) will stand by.")
+    while lock_file is None:
+        await asyncio.sleep(SOCKET_MODE_RETRY_SECONDS)
+        lock_file = _try_acquire_socket_mode_lock()
+
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+    from bolt_app import create_bolt_app
+    print(f"Lifespan: Starting Bolt Socket Mode Handler in worker pid {os.getpid()}...")
+    bolt_app = create_bolt_app(lambda: getattr(app.state, "primary_agent", None))
+    socket_handler = AsyncSocketModeHandler(bolt_app, app_token)
+    try:
+        print("Lifespan: Bolt Socket Mode Handler started.")
+        await socket_handler.start_async()
+    finally:
+        await socket_handler.close_async()
+        lock_file.close()
 
 # --- Lifespan Manager ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: initialize resources
+    from mcp_agent_army import get_mcp_agent_army
+
     print("Lifespan: Initializing MCP Agent Army...")
     agent, mcp_stack = await get_mcp_agent_army()
     app.state.primary_agent = agent # Store agent in app state
@@ -42,12 +75,10 @@ async def lifespan(app: FastAPI):
     # Start Socket Mode Handler in background
     SLACK_APP_TOKEN = os.environ.get("SLACK_APP_TOKEN")
     if SLACK_APP_TOKEN:
-        print("Lifespan: Starting Bolt Socket Mode Handler...")
-        socket_handler = AsyncSocketModeHandler(bolt_app, SLACK_APP_TOKEN)
-        # Run the handler in a background task
-        socket_task = asyncio.create_task(socket_handler.start_async())
+        # With several uvicorn workers only one may hold the Socket Mode connection;
+        # the others wait on the lock and take over if the owner goes away.
+        socket_task = asyncio.create_task(_run_socket_mode(app, SLACK_APP_TOKEN))
         app.state.socket_task = socket_task # Store task to potentially cancel later
-        print("Lifespan: Bolt Socket Mode Handler started.")
     else:
         print("Warning: SLACK_APP_TOKEN not set. Bolt Socket Mode Handler not started.")
         app.state.socket_task = None
@@ -66,21 +97,11 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             print("Lifespan: Bolt Socket Mode Handler task cancelled.")
 
-# --- FastAPI App Initialization ---
-app = FastAPI(lifespan=lifespan)
-security = HTTPBearer()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    # Deliver Slack replies that are still queued before the process exits
+    from slack_delivery import close_delivery_queues
+    await close_delivery_queues()
 
-# --- Shared Utilities Import ---
-# Import shared Supabase functions
-from supabase_utils import fetch_conversation_history, store_message
+security = HTTPBearer()
 
 # --- Request/Response Models ---
 class AgentRequest(BaseModel):
@@ -109,19 +130,36 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
     return True
 
 # --- API Endpoints ---
-@app.get("/")
+router = APIRouter()
+
+@router.get("/")
 async def read_root():
     print("🔍 Received request for root /")
     return {"status": "ok", "message": "MCP Agent Army Endpoint is running!"}
 
+@router.get("/metrics")
+async def metrics(authenticated: bool = Depends(verify_token)):
+    """
+    Token usage per agent, model, source and channel, and MCP tool-list cache counters,
+    in the Prometheus text format. Requires API_BEARER_TOKEN, like the API.
+
+    Counters are kept per worker process and every series carries a `worker` label,
+    since with WEB_CONCURRENCY>1 each scrape reaches whichever worker accepts it.
+    """
+    from mcp_tool_cache import render_tool_list_metrics
+    return PlainTextResponse(get_usage_metrics().render() + render_tool_list_metrics(), media_type="text/plain; version=0.0.4")
+
 # Note: Slack router is removed as Bolt handles Slack events now
 
-@app.post("/api/mcp-agent-army", response_model=AgentResponse)
+@router.post("/api/mcp-agent-army", response_model=AgentResponse)
 async def mcp_agent_army(
     agent_request: AgentRequest, # Incoming data model
     request: Request,           # FastAPI Request object to access app state
     authenticated: bool = Depends(verify_token)
 ):
+    from mcp_agent_army import PRIMARY_SYSTEM_PROMPT
+    from prompt_cache import build_message_history
+
     # Use agent_request for data, request for app state
     print(f"🔍 Received API request for session_id: {agent_request.session_id}, request_id: {agent_request.request_id}, query: '{agent_request.query}'")
 
@@ -144,17 +182,7 @@ async def mcp_agent_army(
         print(f"API Fetched {len(conversation_history)} messages from history.")
 
         # Convert conversation history to format expected by agent
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = msg_data["type"]
-            msg_content = msg_data["content"]
-            # Ensure content is string
-            if isinstance(msg_content, str):
-                 msg_obj = ModelRequest(parts=[UserPromptPart(content=msg_content)]) if msg_type == "human" else ModelResponse(parts=[TextPart(content=msg_content)])
-                 messages.append(msg_obj)
-            else:
-                 print(f"Warning: Skipping message with non-string content: {msg_content}")
+        messages = build_message_history(conversation_history, PRIMARY_SYSTEM_PROMPT)
 
 
         # Store user's query
@@ -172,11 +200,14 @@ async def mcp_agent_army(
              print("Error: Primary agent not found in app state.")
              raise HTTPException(status_code=500, detail="Agent not initialized")
 
-        # Run the agent with conversation history
-        result = await agent.run(
-            agent_request.query,
-            message_history=messages
-        )
+        # Run the agent with conversation history; sub-agent runs are recorded in the same ledger
+        with track_request(agent_request.request_id, agent_request.session_id, source="api") as usage, bound_request():
+            result = await run_bounded(
+                agent,
+                agent_request.query,
+                message_history=messages,
+                usage_limits=usage.usage_limits()
+            )
         response_text = result.data if hasattr(result, "data") else str(result)
         print(f"API Agent returned response: '{response_text}'")
 
@@ -186,7 +217,7 @@ async def mcp_agent_army(
             session_id=agent_request.session_id,
             message_type="ai",
             content=response_text, # Use response_text
-            data={"request_id": agent_request.request_id}
+            data={"request_id": agent_request.request_id, "usage": usage.summary()}
         )
         print(f"API Agent response stored. Request successful.")
 
@@ -213,12 +244,42 @@ async def mcp_agent_army(
              print(f"Error storing error message to Supabase: {store_err}")
         return AgentResponse(success=False)
 
+# --- FastAPI App Factory ---
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application.
+
+    Loads environment variables and wires middleware and routes; the agents, MCP servers
+    and Slack connection are started by the lifespan once the server is up.
+    Run with: uvicorn mcp_agent_army_endpoint:create_app --factory
+    """
+    load_dotenv()
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
+
+
+_app: Optional[FastAPI] = None
+
+def __getattr__(name: str):
+    # Backwards compatibility for `mcp_agent_army_endpoint:app`: built on first access, not at import.
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Note: The if __name__ == "__main__": block is for local testing.
 # Railway will use the CMD in the Dockerfile.
 if __name__ == "__main__":
     import uvicorn
-    # This won't run the Socket Mode handler when run directly like this.
-    # For local testing of both, you'd need a different entry point
-    # or run bolt_app.py separately.
-    print("Running FastAPI app directly (Socket Mode handler will not start automatically)")
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    print("Running FastAPI app directly")
+    uvicorn.run(create_app(), host="0.0.0.0", port=8001)
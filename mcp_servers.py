@@ -0,0 +1,160 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import json
+import os
+import shutil
+
+if TYPE_CHECKING:
+    from pydantic_ai.mcp import MCPServer
+
+# Directory holding the `npm install` output. In the Docker image this is /app/node_modules.
+NODE_MODULES_DIR = Path(os.getenv("MCP_NODE_MODULES_DIR", Path(__file__).resolve().parent / "node_modules"))
+# The only place npm package versions are pinned; `npm ci` installs exactly these.
+PACKAGE_LOCK = Path(__file__).resolve().parent / "package-lock.json"
+
+
+@lru_cache(maxsize=None)
+def _locked_versions() -> Dict[str, str]:
+    """Top-level package versions from package-lock.json, by package name."""
+    try:
+        lock = json.loads(PACKAGE_LOCK.read_text())
+    except (OSError, ValueError):
+        return {}
+    prefix = "node_modules/"
+    return {
+        path[len(prefix):]: entry["version"]
+        for path, entry in (lock.get("packages") or {}).items()
+        if path.startswith(prefix) and "/node_modules/" not in path and "version" in entry
+    }
+
+# ========== MCP server launch definitions ==========
+
+@dataclass(frozen=True)
+class MCPServerSpec:
+    """
+    Launch definition for one MCP server.
+
+    npm-based servers set `package` and `bin`; anything else sets `command`.
+    Definitions come from the `server` block of each service in services.yaml, and
+    the version of an npm package from package-lock.json.
+    """
+    name: str
+    package: Optional[str] = None
+    version: Optional[str] = None
+    bin: Optional[str] = None
+    command: Optional[str] = None
+    args: Tuple[str, ...] = ()
+    # Maps the variable name the server expects to the variable we read it from.
+    env: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any]) -> "MCPServerSpec":
+        """Build a spec from a `server` block, validating that it can be launched."""
+        package = config.get("package")
+        if not config.get("command") and not package:
+            raise ValueError(f"MCP server '{name}' needs either 'command' or 'package'.")
+        if "version" in config:
+            raise ValueError(f"MCP server '{name}': remove 'version'; package versions are pinned in package.json.")
+        version = _locked_versions().get(package) if package else None
+        if package and not version:
+            raise ValueError(f"MCP server '{name}': {package} is not in {PACKAGE_LOCK.name}; add it to package.json and run npm install.")
+        return cls(
+            name=name,
+            package=package,
+            version=version,
+            bin=config.get("bin") or (package.rsplit("/", 1)[-1] if package else None),
+            command=config.get("command"),
+            args=tuple(str(arg) for arg in config.get("args", ())),
+            env={str(k): str(v) for k, v in (config.get("env") or {}).items()},
+        )
+
+    def resolve_args(self) -> List[str]:
+        """Expand `${VAR}` / `${VAR:-default}` references in the configured args."""
+        return [_expand(arg) for arg in self.args]
+
+    def resolve_env(self) -> Dict[str, str]:
+        """Build the server environment from our own environment, skipping unset values."""
+        env = {}
+        for server_var, source_var in self.env.items():
+            value = os.getenv(source_var)
+            if value is not None:
+                env[server_var] = value
+        return env
+
+
+def _expand(value: str) -> str:
+    if not (value.startswith("${") and value.endswith("}")):
+        return value
+    var, _, default = value[2:-1].partition(":-")
+    return os.getenv(var, default)
+
+
+# ========== Launch command resolution ==========
+
+def _installed_entry_point(spec: MCPServerSpec) -> Optional[Path]:
+    """
+    Return the JS entry point of an installed package, or None if it isn't installed.
+
+    Raises RuntimeError if it is installed at a different version than the lockfile
+    pins, rather than quietly falling back to downloading the pinned one with npx.
+    """
+    package_dir = NODE_MODULES_DIR / spec.package
+    try:
+        manifest = json.loads((package_dir / "package.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != spec.version:
+        raise RuntimeError(
+            f"{spec.package} is installed at {manifest.get('version')} but {PACKAGE_LOCK.name} pins {spec.version}; "
+            f"run `npm ci` to update {NODE_MODULES_DIR}."
+        )
+    bin_entry = manifest.get("bin")
+    if isinstance(bin_entry, dict):
+        bin_entry = bin_entry.get(spec.bin)
+    if not bin_entry:
+        return None
+    entry_point = (package_dir / bin_entry).resolve()
+    return entry_point if entry_point.is_file() else None
+
+
+def resolve_command(spec: MCPServerSpec, use_npx: bool = False) -> Tuple[str, List[str]]:
+    """
+    Resolve the command used to launch an MCP server.
+
+    Prefers running the installed entry point with `node` directly, which skips
+    npx package resolution and the `.bin` shell shim. Falls back to
+    `npx -y <package>@<version>` when the package isn't installed locally.
+    Servers defined with an explicit `command` are launched as configured.
+    """
+    if spec.command:
+        return _expand(spec.command), spec.resolve_args()
+    node = shutil.which("node")
+    entry_point = None if use_npx else _installed_entry_point(spec)
+    if node and entry_point:
+        return node, [str(entry_point), *spec.resolve_args()]
+    if not use_npx:
+        print(f"Warning: {spec.package}@{spec.version} not found in {NODE_MODULES_DIR}, falling back to npx.")
+    return "npx", ["-y", f"{spec.package}@{spec.version}", *spec.resolve_args()]
+
+
+def create_mcp_server(spec: MCPServerSpec) -> MCPServer:
+    """
+    Create the MCP server for a launch definition.
+
+    When MCP_SIDECAR_URL is set, connects to the shared sidecar (mcp_sidecar.py) over
+    SSE instead of spawning a stdio process, so multiple workers share one set of servers.
+    Either way the server's tool list is cached for the life of the connection
+    (see mcp_tool_cache).
+    """
+    from mcp_tool_cache import CachedMCPServerHTTP, CachedMCPServerStdio
+    sidecar_url = os.getenv("MCP_SIDECAR_URL")
+    if sidecar_url:
+        server = CachedMCPServerHTTP(url=f"{sidecar_url.rstrip('/')}/{spec.name}/sse")
+    else:
+        command, args = resolve_command(spec)
+        server = CachedMCPServerStdio(command, args, env=spec.resolve_env())
+    server.cache_name = spec.name
+    return server
@@ -0,0 +1,164 @@
+"""
+Shared MCP server sidecar.
+
+Starts the stdio MCP server of every enabled service once and re-exposes each
+one over the MCP SSE transport on a loopback port, so several uvicorn workers
+can share a single set of Node processes:
+
+    http://127.0.0.1:8765/<service>/sse
+
+Workers use the sidecar when MCP_SIDECAR_URL is set (see mcp_servers.create_mcp_server).
+Run with: python mcp_sidecar.py
+"""
+from __future__ import annotations
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Dict, List, Optional
+import os
+import weakref
+
+from dotenv import load_dotenv
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+from mcp.server.lowlevel import Server
+from mcp.server.sse import SseServerTransport
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from mcp_servers import resolve_command
+from service_registry import ServiceConfig, load_services
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class _ToolListProxy:
+    """
+    Upstream tool list, cached until the upstream server reports a change.
+
+    Downstream sessions are remembered when they list tools, so a change can be
+    passed on to every worker that may have cached the old list.
+    """
+
+    def __init__(self, session: Any):
+        self.session = session
+        self.tools: Optional[List[types.Tool]] = None
+        self.downstream: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+    async def list_tools(self, downstream: Any) -> List[types.Tool]:
+        self.downstream.add(downstream)
+        if self.tools is None:
+            self.tools = (await self.session.list_tools()).tools
+        return self.tools
+
+    async def changed(self) -> None:
+        self.tools = None
+        for downstream in list(self.downstream):
+            try:
+                await downstream.send_tool_list_changed()
+            except Exception as e:
+                print(f"Sidecar: could not forward tool list change: {e}")
+
+
+def _proxy_server(name: str, session: ClientSession, tool_list: _ToolListProxy) -> Server:
+    """Build an MCP server that forwards tool requests to an upstream client session."""
+    server = Server(f"mcp-sidecar-{name}")
+
+    @server.list_tools()
+    async def list_tools() -> List[types.Tool]:
+        return await tool_list.list_tools(server.request_context.session)
+
+    async def call_tool(request: types.CallToolRequest) -> types.ServerResult:
+        # Forward the upstream result as-is so `isError` and all content types survive the hop
+        result = await session.call_tool(request.params.name, request.params.arguments or {})
+        return types.ServerResult(result)
+
+    server.request_handlers[types.CallToolRequest] = call_tool
+    return server
+
+
+def _sse_routes(name: str, server: Server) -> List[Any]:
+    sse = SseServerTransport(f"/{name}/messages/")
+
+    async def handle_sse(request: Request) -> None:
+        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
+            await server.run(streams[0], streams[1], server.create_initialization_options())
+
+    return [
+        Route(f"/{name}/sse", endpoint=handle_sse),
+        Mount(f"/{name}/messages/", app=sse.handle_post_message),
+    ]
+
+
+class _SessionRef:
+    """Late-bound stand-in for a ClientSession that is only started by the sidecar lifespan."""
+
+    def __init__(self, sessions: Dict[str, ClientSession], name: str):
+        self._sessions = sessions
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        try:
+            session = self._sessions[self._name]
+        except KeyError:
+            raise RuntimeError(f"MCP server '{self._name}' is not running") from None
+        return getattr(session, attr)
+
+
+def create_sidecar_app(services: Optional[List[ServiceConfig]] = None) -> Starlette:
+    """
+    Build the sidecar ASGI app.
+
+    The upstream stdio servers are started by the app's lifespan and stay up
+    for as long as the sidecar runs; `/healthz` reports ready once they all are.
+    """
+    services = services if services is not None else load_services()
+    sessions: Dict[str, ClientSession] = {}
+
+    async def healthz(request: Request) -> JSONResponse:
+        ready = len(sessions) == len(services)
+        return JSONResponse({"ready": ready, "services": sorted(sessions)}, status_code=200 if ready else 503)
+
+    routes: List[Any] = [Route("/healthz", endpoint=healthz)]
+    # Routes are registered up front; each proxy resolves its session lazily once the lifespan has started it.
+    tool_lists = {service.name: _ToolListProxy(_SessionRef(sessions, service.name)) for service in services}
+    for service in services:
+        session_ref = _SessionRef(sessions, service.name)
+        routes.extend(_sse_routes(service.name, _proxy_server(service.name, session_ref, tool_lists[service.name])))
+
+    def upstream_message_handler(name: str):
+        async def handle(message: Any) -> None:
+            if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+                print(f"Sidecar: {name} reported a tool list change.")
+                await tool_lists[name].changed()
+        return handle
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        async with AsyncExitStack() as stack:
+            for service in services:
+                command, args = resolve_command(service.server)
+                params = StdioServerParameters(command=command, args=args, env=service.server.resolve_env())
+                read_stream, write_stream = await stack.enter_async_context(stdio_client(params))
+                session = await stack.enter_async_context(
+                    ClientSession(read_stream, write_stream, message_handler=upstream_message_handler(service.name))
+                )
+                await session.initialize()
+                sessions[service.name] = session
+                print(f"Sidecar: {service.name} MCP server started.")
+            print(f"Sidecar: all {len(sessions)} MCP servers started.")
+            yield
+            print("Sidecar: shutting down MCP servers...")
+            sessions.clear()
+
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    load_dotenv()
+    host = os.getenv("MCP_SIDECAR_HOST", DEFAULT_HOST)
+    port = int(os.getenv("MCP_SIDECAR_PORT", DEFAULT_PORT))
+    print(f"Starting MCP sidecar on http://{host}:{port}")
+    uvicorn.run(create_sidecar_app(), host=host, port=port)
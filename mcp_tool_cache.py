@@ -0,0 +1,129 @@
+# MCP servers whose tool list is fetched once per connection.
+# pydantic_ai asks every MCP server for its tools before each model request and
+# again to route each tool call, which costs a JSON-RPC round trip and fresh
+# ToolDefinition objects every time. Imported where it's used (see
+# mcp_servers.create_mcp_server), since it pulls in pydantic_ai.
+from __future__ import annotations
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+import time
+
+from mcp import ClientSession, types
+from pydantic_ai.mcp import MCPServerHTTP, MCPServerStdio
+from pydantic_ai.tools import ToolDefinition
+
+from recording import record_event
+from usage_accounting import worker_label
+
+
+@dataclass
+class ToolListStats:
+    fetches: int = 0
+    hits: int = 0
+    invalidations: int = 0
+    # Duration of the most recent real fetch, used as the cost of each cache hit
+    last_fetch_seconds: float = 0.0
+    saved_seconds: float = 0.0
+
+
+# Stats per server name, for /metrics and per-call logging
+_stats: Dict[str, ToolListStats] = {}
+
+def tool_list_stats(name: str) -> ToolListStats:
+    return _stats.setdefault(name, ToolListStats())
+
+
+def all_tool_list_stats() -> Dict[str, ToolListStats]:
+    return dict(_stats)
+
+
+class CachedToolListMixin:
+    """
+    Serves `list_tools` from memory for the lifetime of the connection.
+
+    The cache is dropped when the server (re)starts and when it sends a
+    `notifications/tools/list_changed` notification. The same ToolDefinition
+    objects are returned on every hit, so per-definition work downstream
+    (prompt_cache.PrefixCachingModel) is done once as well.
+    """
+    cache_name: str = "mcp"
+    _tool_defs: Optional[List[ToolDefinition]] = None
+
+    @property
+    def stats(self) -> ToolListStats:
+        return tool_list_stats(self.cache_name)
+
+    def invalidate_tools(self) -> None:
+        if self._tool_defs is not None:
+            self.stats.invalidations += 1
+        self._tool_defs = None
+
+    async def list_tools(self) -> List[ToolDefinition]:
+        tool_defs = self._tool_defs
+        if tool_defs is not None:
+            self.stats.hits += 1
+            self.stats.saved_seconds += self.stats.last_fetch_seconds
+            return tool_defs
+        start = time.perf_counter()
+        tool_defs = await super().list_tools()
+        self.stats.fetches += 1
+        self.stats.last_fetch_seconds = time.perf_counter() - start
+        self._tool_defs = tool_defs
+        record_event("mcp", server=self.cache_name, method="tools/list", duration=self.stats.last_fetch_seconds,
+                     result=[asdict(tool_def) for tool_def in tool_defs])
+        return tool_defs
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> types.CallToolResult:
+        start = time.perf_counter()
+        result = await super().call_tool(tool_name, arguments)
+        record_event("mcp", server=self.cache_name, method="tools/call", duration=time.perf_counter() - start,
+                     params={"name": tool_name, "arguments": arguments}, result=result.model_dump(mode="json"))
+        return result
+
+    async def _handle_message(self, message: Any) -> None:
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            print(f"MCP server {self.cache_name} reported a tool list change.")
+            self.invalidate_tools()
+
+    async def __aenter__(self) -> Any:
+        # Same as MCPServer.__aenter__, but the session gets a message handler so
+        # list_changed notifications reach the cache
+        self._tool_defs = None
+        self._exit_stack = AsyncExitStack()
+        self._read_stream, self._write_stream = await self._exit_stack.enter_async_context(self.client_streams())
+        client = ClientSession(read_stream=self._read_stream, write_stream=self._write_stream,
+                               message_handler=self._handle_message)
+        self._client = await self._exit_stack.enter_async_context(client)
+        await self._client.initialize()
+        self.is_running = True
+        return self
+
+    async def __aexit__(self, *args: Any) -> Any:
+        self._tool_defs = None
+        return await super().__aexit__(*args)
+
+
+class CachedMCPServerStdio(CachedToolListMixin, MCPServerStdio):
+    pass
+
+
+class CachedMCPServerHTTP(CachedToolListMixin, MCPServerHTTP):
+    pass
+
+
+def render_tool_list_metrics() -> str:
+    """Tool-list cache counters in the Prometheus text format."""
+    metrics = {
+        "mcp_agent_army_tool_list_fetches_total": lambda stats: stats.fetches,
+        "mcp_agent_army_tool_list_cache_hits_total": lambda stats: stats.hits,
+        "mcp_agent_army_tool_list_invalidations_total": lambda stats: stats.invalidations,
+        "mcp_agent_army_tool_list_saved_seconds_total": lambda stats: round(stats.saved_seconds, 6),
+    }
+    lines: List[str] = []
+    for metric, value in metrics.items():
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(
+            f'{metric}{{{worker_label()},server="{name}"}} {value(stats)}' for name, stats in sorted(all_tool_list_stats().items())
+        )
+    return "\n".join(lines) + "\n"
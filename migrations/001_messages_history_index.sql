@@ -0,0 +1,82 @@
+-- Conversation history: composite index, archive table and archiving function.
+--
+-- Every request reads the latest messages of one session:
+--     select ... from messages where session_id = $1 order by created_at desc limit 10
+-- With only single-column indexes (or none) Postgres has to collect and sort every
+-- row of the session, or walk the created_at index across all sessions, so latency
+-- grows with the table. The composite index answers the query with a short index
+-- scan that stops after `limit` rows, independent of table size.
+--
+-- Apply with the Supabase SQL editor, `supabase db push`, or
+--     psql "$DATABASE_URL" -f migrations/001_messages_history_index.sql
+-- The migration is idempotent.
+
+-- Baseline table, for fresh databases. Existing deployments already have it.
+create table if not exists messages (
+    id bigserial primary key,
+    created_at timestamptz not null default now(),
+    session_id text not null,
+    message jsonb not null
+);
+
+-- On a large, busy table run this statement on its own first as
+-- `create index concurrently ...` (outside a transaction) to avoid blocking writes.
+create index if not exists idx_messages_session_created_at
+    on messages (session_id, created_at desc);
+
+-- A separate single-column index on messages (session_id), if your deployment has
+-- one, is covered by the composite index and only costs writes. Check what it is
+-- for first, then drop it by its actual name, e.g.:
+--     drop index if exists <your_session_id_index>;
+
+-- ========== Archiving inactive sessions ==========
+-- Optional. Keeps the hot table small by moving sessions that have been idle for
+-- a while into messages_archive. Nothing calls this automatically; schedule it
+-- with pg_cron, for example:
+--     select cron.schedule('archive-messages', '0 3 * * *',
+--                          $$select archive_inactive_sessions('90 days')$$);
+
+create table if not exists messages_archive (
+    like messages including defaults,
+    archived_at timestamptz not null default now()
+);
+
+create index if not exists idx_messages_archive_session_created_at
+    on messages_archive (session_id, created_at desc);
+
+create or replace function archive_inactive_sessions(
+    idle_for interval default '90 days',
+    batch_size integer default 10000
+) returns integer
+language plpgsql
+as $$
+declare
+    moved integer;
+begin
+    -- Moves at most `batch_size` rows per call so each run holds locks briefly;
+    -- call it repeatedly until it returns 0 to drain a backlog.
+    with inactive as (
+        select session_id
+        from messages
+        group by session_id
+        having max(created_at) < now() - idle_for
+    ),
+    doomed as (
+        select m.id
+        from messages m
+        join inactive using (session_id)
+        limit batch_size
+    ),
+    moved_rows as (
+        delete from messages m
+        using doomed
+        where m.id = doomed.id
+        returning m.id, m.created_at, m.session_id, m.message
+    )
+    insert into messages_archive (id, created_at, session_id, message)
+    select id, created_at, session_id, message from moved_rows;
+
+    get diagnostics moved = row_count;
+    return moved;
+end;
+$$;
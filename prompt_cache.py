@@ -0,0 +1,97 @@
+# Keeps request prefixes byte-stable so provider-side prompt caching can reuse them.
+# OpenAI, Groq and Gemini cache repeated prompt prefixes automatically (their chat
+# APIs have no cache-control markers); a hit needs the system prompt, tools and
+# earlier messages to be identical and in the same order as a previous request.
+# Imported where it's used, since it pulls in pydantic_ai.
+from __future__ import annotations
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+import os
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.tools import ToolDefinition
+
+from result_guard import compact_text
+
+# History messages above this size are compacted before they reach the model
+DEFAULT_MAX_HISTORY_MESSAGE_BYTES = 16000
+
+# ========== Stable message history ==========
+
+def build_message_history(conversation_history: List[Dict[str, Any]], system_prompt: Optional[str] = None) -> List[ModelMessage]:
+    """
+    Convert stored history rows (`type`, `content`) into model messages.
+
+    pydantic_ai only adds an agent's system prompt when there is no history, so
+    without this the first turn of a session starts with the system prompt and
+    every later turn doesn't. Putting it back at the start keeps the orchestrator's
+    instructions on every turn and gives every request the same cacheable prefix.
+    """
+    # Messages are stored whole; very long ones are compacted here so one long answer
+    # can't crowd out the rest of the context
+    max_bytes = int(os.getenv("MAX_HISTORY_MESSAGE_BYTES", DEFAULT_MAX_HISTORY_MESSAGE_BYTES))
+    messages: List[ModelMessage] = []
+    for msg in conversation_history:
+        msg_type, msg_content = msg["type"], msg["content"]
+        if not isinstance(msg_content, str):
+            print(f"Warning: Skipping message with non-string content: {msg_content}")
+            continue
+        msg_content = compact_text(msg_content, max_bytes)
+        if msg_type == "human":
+            messages.append(ModelRequest(parts=[UserPromptPart(content=msg_content)]))
+        else:
+            messages.append(ModelResponse(parts=[TextPart(content=msg_content)]))
+
+    if messages and system_prompt:
+        first = messages[0]
+        if isinstance(first, ModelRequest):
+            first.parts.insert(0, SystemPromptPart(content=system_prompt))
+        else:
+            messages.insert(0, ModelRequest(parts=[SystemPromptPart(content=system_prompt)]))
+    return messages
+
+
+# ========== Memoized, ordered tool definitions ==========
+
+class PrefixCachingModel(WrapperModel):
+    """
+    Model wrapper that serves provider-specific tool schemas from a local cache
+    and always sends tools in the same (name) order.
+
+    Providers rewrite every tool's JSON schema on every request (strict-mode
+    conversion for OpenAI, schema simplification for Gemini). The result depends
+    only on the tool definition, so it is computed once per definition.
+    """
+
+    def __init__(self, wrapped: Model):
+        super().__init__(wrapped)
+        # key -> (source schema, customized definition); the source schema is kept so
+        # an id() can't be reused by a different dict while its entry is cached
+        self._tool_defs: Dict[Tuple[Any, ...], Tuple[Dict[str, Any], ToolDefinition]] = {}
+        self.schema_cache_hits = 0
+        self.schema_cache_misses = 0
+
+    def _customize(self, tool: ToolDefinition) -> ToolDefinition:
+        key = (tool.name, tool.description, tool.strict, id(tool.parameters_json_schema))
+        cached = self._tool_defs.get(key)
+        if cached is not None and cached[0] is tool.parameters_json_schema:
+            self.schema_cache_hits += 1
+            return cached[1]
+        self.schema_cache_misses += 1
+        customized = self.wrapped.customize_request_parameters(
+            ModelRequestParameters(function_tools=[tool], allow_text_result=True, result_tools=[])
+        ).function_tools[0]
+        if len(self._tool_defs) > 1000:
+            self._tool_defs.clear()
+        self._tool_defs[key] = (tool.parameters_json_schema, customized)
+        return customized
+
+    def customize_request_parameters(self, model_request_parameters: ModelRequestParameters) -> ModelRequestParameters:
+        function_tools = sorted(model_request_parameters.function_tools, key=lambda tool: tool.name)
+        return replace(
+            model_request_parameters,
+            function_tools=[self._customize(tool) for tool in function_tools],
+            result_tools=[self._customize(tool) for tool in model_request_parameters.result_tools],
+        )
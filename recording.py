@@ -0,0 +1,103 @@
+# Recording mode: set AGENT_RECORD_DIR to write one JSON-lines file per request_id
+# with every model exchange and MCP call made while handling it. Recordings are
+# replayed offline by benchmarks/replay.py. Writes are small appends made from the
+# event loop, so keep this off in normal operation. Imported where it's used, since
+# it pulls in pydantic_ai.
+from __future__ import annotations
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import re
+import time
+
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelRequest, ModelResponse, UserPromptPart
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+
+from request_limits import current_agent
+from usage_accounting import current_request
+
+
+def recording_dir() -> Optional[Path]:
+    directory = os.getenv("AGENT_RECORD_DIR")
+    return Path(directory) if directory else None
+
+
+def recording_path(directory: Path, request_id: str) -> Path:
+    return directory / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', request_id)}.jsonl"
+
+
+def record_event(kind: str, **data: Any) -> None:
+    """Append an event to the current request's recording. No-op unless recording inside a tracked request."""
+    directory = recording_dir()
+    ledger = current_request()
+    if directory is None or ledger is None:
+        return
+    agent, depth = current_agent()
+    event = {
+        "ts": time.time(),
+        "event": kind,
+        "request_id": ledger.request_id,
+        "session_id": ledger.session_id,
+        "agent": agent,
+        "depth": depth,
+        **data,
+    }
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(recording_path(directory, ledger.request_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"Warning: could not write recording for {ledger.request_id}: {e}")
+
+
+def load_recording(path: str | Path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ========== Model traffic ==========
+
+def _dump_messages(messages: List[ModelMessage]) -> List[Dict[str, Any]]:
+    return ModelMessagesTypeAdapter.dump_python(messages, mode="json")
+
+
+class RecordingModel(WrapperModel):
+    """Records every request to the wrapped model, with its response, usage and duration."""
+
+    def customize_request_parameters(self, model_request_parameters: ModelRequestParameters) -> ModelRequestParameters:
+        return self.wrapped.customize_request_parameters(model_request_parameters)
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> Tuple[ModelResponse, Usage]:
+        start = time.perf_counter()
+        response, usage = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        # The first request of a run carries its whole input (history and prompt); later
+        # ones only add tool results, so only the newest message is kept for those
+        first_request = isinstance(messages[-1], ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in messages[-1].parts
+        )
+        record_event(
+            "model",
+            model=self.model_name,
+            duration=time.perf_counter() - start,
+            messages=_dump_messages(messages if first_request else messages[-1:]),
+            full_input=first_request,
+            response=_dump_messages([response])[0],
+            usage=asdict(usage),
+            tools=[asdict(tool) for tool in model_request_parameters.function_tools] if first_request else None,
+        )
+        return response, usage
+
+
+def with_recording(model: Model) -> Model:
+    """Wrap `model` so its traffic is recorded when AGENT_RECORD_DIR is set."""
+    return RecordingModel(model) if recording_dir() is not None else model
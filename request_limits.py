@@ -0,0 +1,203 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional, Set, Tuple
+import asyncio
+import os
+
+# Defaults for a single user request, across the orchestrator and every nested run.
+DEFAULT_REQUEST_DEADLINE_SECONDS = 120.0
+DEFAULT_MAX_TOOL_CALLS = 20
+# Depth 1 is the orchestrator, depth 2 its sub-agents.
+DEFAULT_MAX_AGENT_DEPTH = 2
+# Sub-agents must finish this long before the request deadline, so the orchestrator
+# still has time to answer with what they returned.
+DEFAULT_SUBAGENT_RESERVE_SECONDS = 15.0
+
+# ========== Per-request limits ==========
+
+@dataclass
+class RequestLimits:
+    """
+    Deadline and loop limits shared by every agent run of one request.
+
+    The deadline is absolute (event-loop time), so nested runs inherit whatever
+    time is left rather than starting a fresh timeout of their own.
+    """
+    deadline: float
+    max_tool_calls: int = DEFAULT_MAX_TOOL_CALLS
+    max_depth: int = DEFAULT_MAX_AGENT_DEPTH
+    subagent_reserve: float = DEFAULT_SUBAGENT_RESERVE_SECONDS
+    tool_calls: int = 0
+    # (agent name, result) of nested runs that finished, used to build a partial answer
+    completed: List[Tuple[str, str]] = field(default_factory=list)
+    stopped: Optional[str] = None
+    _tasks: Set[asyncio.Task] = field(default_factory=set)
+
+    def remaining(self) -> float:
+        return self.deadline - asyncio.get_running_loop().time()
+
+    def deadline_for(self, depth: int) -> float:
+        """Nested runs stop early enough to leave their parent time to respond."""
+        return self.deadline - self.subagent_reserve * depth
+
+    def partial_answer(self) -> str:
+        reason = self.stopped or "it hit a processing limit"
+        if not self.completed:
+            return f"Sorry, I couldn't finish this request because {reason}. Please try a narrower request."
+        findings = "\n\n".join(f"*{name}*:\n{result}" for name, result in self.completed)
+        return f"I couldn't finish this request because {reason}. Here is what I found so far:\n\n{findings}"
+
+
+_current_limits: ContextVar[Optional[RequestLimits]] = ContextVar("current_request_limits", default=None)
+_depth: ContextVar[int] = ContextVar("agent_run_depth", default=0)
+_agent_name: ContextVar[str] = ContextVar("agent_run_name", default="orchestrator")
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+@contextmanager
+def bound_request(timeout: Optional[float] = None) -> Iterator[RequestLimits]:
+    """
+    Apply a deadline and loop limits to every `run_bounded` call inside the block.
+
+    Limits come from REQUEST_DEADLINE_SECONDS, MAX_TOOL_CALLS_PER_REQUEST,
+    MAX_AGENT_DEPTH and SUBAGENT_DEADLINE_RESERVE_SECONDS unless given.
+    """
+    timeout = timeout or _env_float("REQUEST_DEADLINE_SECONDS", DEFAULT_REQUEST_DEADLINE_SECONDS)
+    limits = RequestLimits(
+        deadline=asyncio.get_running_loop().time() + timeout,
+        max_tool_calls=int(_env_float("MAX_TOOL_CALLS_PER_REQUEST", DEFAULT_MAX_TOOL_CALLS)),
+        max_depth=int(_env_float("MAX_AGENT_DEPTH", DEFAULT_MAX_AGENT_DEPTH)),
+        # Never reserve more than a fifth of the request's time for the orchestrator
+        subagent_reserve=min(_env_float("SUBAGENT_DEADLINE_RESERVE_SECONDS", DEFAULT_SUBAGENT_RESERVE_SECONDS), timeout / 5),
+    )
+    token = _current_limits.set(limits)
+    try:
+        yield limits
+    finally:
+        _current_limits.reset(token)
+
+
+def current_limits() -> Optional[RequestLimits]:
+    return _current_limits.get()
+
+
+def record_completed(name: str, text: str) -> None:
+    """
+    Keep a finished sub-agent's result for the partial answer, should the request stop early.
+
+    Callers pass the text as it was handed to the orchestrator (after the result
+    guard's size caps), since the partial answer is sent and stored as is.
+    """
+    limits = _current_limits.get()
+    if limits is not None:
+        limits.completed.append((name, text))
+
+
+def current_agent() -> Tuple[str, int]:
+    """Name and nesting depth of the agent run the caller is part of."""
+    return _agent_name.get(), _depth.get()
+
+
+# ========== Bounded agent runs ==========
+
+class _LimitReached(Exception):
+    pass
+
+
+@dataclass
+class PartialRun:
+    """Stands in for an agent run result when the run was stopped early."""
+    data: str
+    _usage: Any
+    partial: bool = True
+
+    def usage(self) -> Any:
+        return self._usage
+
+
+async def run_bounded(agent: Any, prompt: str, name: str = "orchestrator", **kwargs: Any) -> Any:
+    """
+    Run `agent` within the current request's limits.
+
+    Returns the normal run result, or a `PartialRun` whose `data` is a partial
+    answer if the run passed its deadline or the request ran out of tool calls.
+    Outside `bound_request` this is just `agent.run`.
+
+    The run's usage is recorded under `name` in the current request's ledger
+    (usage_accounting) even when the run fails, so failed requests still count
+    against the session budget. The request's token budget is checked between
+    steps against every run of the request, finished or not, and spending it
+    stops the run like any other limit.
+    """
+    from usage_accounting import current_request, record_run, record_usage
+
+    limits = _current_limits.get()
+    if limits is None:
+        result = await agent.run(prompt, **kwargs)
+        record_run(name, result, agent.model)
+        return result
+
+    from pydantic_ai import Agent
+    from pydantic_ai.exceptions import UsageLimitExceeded
+    from pydantic_ai.messages import ToolCallPart
+    from pydantic_ai.usage import Usage
+
+    depth = _depth.get() + 1
+    if depth > limits.max_depth:
+        limits.stopped = f"agents may only be nested {limits.max_depth} deep"
+        return PartialRun(data=f"Not run: {limits.stopped}.", _usage=Usage())
+
+    task = asyncio.current_task()
+    if depth > 1 and task is not None:
+        limits._tasks.add(task)
+    token = _depth.set(depth)
+    name_token = _agent_name.set(name)
+    ledger = current_request()
+    agent_run = None
+    try:
+        async with asyncio.timeout_at(limits.deadline_for(depth - 1)):
+            async with agent.iter(prompt, **kwargs) as agent_run:
+                if ledger is not None:
+                    ledger.start_run(agent_run.usage())
+                async for node in agent_run:
+                    if ledger is not None and ledger.budget_spent():
+                        limits.stopped = "it used up its token budget"
+                        raise _LimitReached()
+                    if Agent.is_call_tools_node(node):
+                        calls = sum(isinstance(part, ToolCallPart) for part in node.model_response.parts)
+                        if limits.tool_calls + calls > limits.max_tool_calls:
+                            limits.stopped = f"it reached the limit of {limits.max_tool_calls} tool calls"
+                            raise _LimitReached()
+                        limits.tool_calls += calls
+        return agent_run.result
+    except (TimeoutError, UsageLimitExceeded, _LimitReached) as e:
+        if isinstance(e, TimeoutError):
+            limits.stopped = limits.stopped or "it ran past its time limit"
+        elif isinstance(e, UsageLimitExceeded):
+            if ledger is not None:
+                ledger.budget_spent()
+            limits.stopped = limits.stopped or f"it reached a usage limit ({e})"
+        print(f"{name} agent stopped early: {limits.stopped}")
+        usage = agent_run.usage() if agent_run is not None else Usage()
+        if depth > 1:
+            return PartialRun(data=f"The {name} agent did not finish: {limits.stopped}.", _usage=usage)
+        return PartialRun(data=limits.partial_answer(), _usage=usage)
+    finally:
+        if agent_run is not None:
+            record_usage(name, agent_run.usage(), agent.model)
+        _depth.reset(token)
+        _agent_name.reset(name_token)
+        limits._tasks.discard(task)
+        if depth == 1:
+            # Tool tasks are not cancelled with their parent run; make sure nothing outlives the request
+            for orphan in list(limits._tasks):
+                orphan.cancel()
+            if limits._tasks:
+                await asyncio.gather(*limits._tasks, return_exceptions=True)
+                limits._tasks.clear()
@@ -0,0 +1,218 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# ========== Size limits ==========
+# Defaults used when a service in services.yaml doesn't set its own caps.
+DEFAULT_MAX_RESULT_BYTES = 8000
+DEFAULT_MAX_RESULT_TOKENS = 2000
+# Rough bytes-per-token ratio used to turn token caps into byte caps without a tokenizer.
+BYTES_PER_TOKEN = 4
+
+RETRIEVE_TOOL_NAME = "retrieve_full_result"
+
+
+def result_byte_limit(max_bytes: Optional[int] = None, max_tokens: Optional[int] = None) -> int:
+    """Effective byte cap: the smaller of the byte cap and the token cap, falling back to the env/defaults."""
+    if max_bytes is None:
+        max_bytes = int(os.getenv("SUBAGENT_RESULT_MAX_BYTES", DEFAULT_MAX_RESULT_BYTES))
+    if max_tokens is None:
+        max_tokens = int(os.getenv("SUBAGENT_RESULT_MAX_TOKENS", DEFAULT_MAX_RESULT_TOKENS))
+    return max(256, min(max_bytes, max_tokens * BYTES_PER_TOKEN))
+
+
+# ========== Out-of-band storage for full payloads ==========
+
+class ResultStore:
+    """
+    Stores full sub-agent results on local disk under a content-addressed handle.
+
+    The directory is shared by every worker in the container, so a handle issued
+    by one worker can be retrieved by another. Entries expire after `ttl_seconds`
+    and don't survive a redeploy, so handles are only meant to be used within the
+    request that produced them and must not be persisted.
+    """
+
+    def __init__(self, directory: Optional[str | Path] = None, ttl_seconds: Optional[int] = None):
+        self.directory = Path(directory or os.getenv("RESULT_STORE_DIR") or Path(tempfile.gettempdir()) / "mcp_agent_army_results")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("RESULT_STORE_TTL_SECONDS", 24 * 3600))
+        self._last_prune = 0.0
+
+    def _path(self, handle: str) -> Path:
+        if not handle.isalnum():
+            raise ValueError(f"Invalid result handle: {handle!r}")
+        return self.directory / f"{handle}.txt"
+
+    def put(self, text: str) -> str:
+        """Store `text` and return its handle. Identical payloads share one handle."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle = hashlib.sha256(text.encode("utf-8")).hexdigest()[:20]
+        path = self._path(handle)
+        if not path.exists():
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(path)
+        self._prune()
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        try:
+            return self._path(handle).read_text(encoding="utf-8")
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+        for path in self.directory.glob("*.txt"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+_store: Optional[ResultStore] = None
+
+def get_result_store() -> ResultStore:
+    """Return the process-wide result store, created on first use."""
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
+
+
+# ========== Extractive compaction ==========
+
+def _dedupe_lines(text: str, min_length: int = 8) -> str:
+    """Drop repeated lines and collapse runs of blank lines. Short lines (braces, separators) are kept."""
+    seen = set()
+    lines: List[str] = []
+    for line in text.splitlines():
+        key = line.strip()
+        if not key:
+            if lines and not lines[-1].strip():
+                continue
+        elif len(key) >= min_length:
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _extract_keys(value: Any, max_items: int = 5, max_str: int = 300, depth: int = 0) -> Any:
+    """Keep the shape of a JSON value while trimming long strings and lists."""
+    if isinstance(value, dict):
+        if depth >= 3:
+            return f"{{... {len(value)} keys}}"
+        return {k: _extract_keys(v, max_items, max_str, depth + 1) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_extract_keys(v, max_items, max_str, depth + 1) for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... {len(value) - max_items} more items")
+        return items
+    if isinstance(value, str) and len(value) > max_str:
+        return value[:max_str] + f"... [{len(value) - max_str} chars]"
+    return value
+
+
+def _parse_json(text: str) -> Any:
+    stripped = text.strip()
+    if stripped[:1] not in ("{", "["):
+        return None
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        return None
+
+
+def _head_tail(text: str, limit: int) -> str:
+    """Keep the start and end of `text` within `limit` bytes, with a marker for what was cut."""
+    encoded = text.encode("utf-8")
+    # Reserve room for the marker using the largest number it could show
+    budget = max(0, limit - len(f"\n[... {len(encoded)} bytes omitted ...]\n".encode("utf-8")))
+    head_bytes, tail_bytes = budget * 2 // 3, budget // 3
+    head = encoded[:head_bytes].decode("utf-8", errors="ignore")
+    tail = encoded[len(encoded) - tail_bytes:].decode("utf-8", errors="ignore") if tail_bytes else ""
+    omitted = len(encoded) - head_bytes - tail_bytes
+    return f"{head}\n[... {omitted} bytes omitted ...]\n{tail}"
+
+
+def compact_text(text: str, limit: int) -> str:
+    """
+    Reduce `text` to at most `limit` bytes.
+
+    JSON payloads are reduced to their keys with trimmed values and lists; other text
+    is de-duplicated line by line. Whatever is still too large is cut to a head and tail.
+    """
+    if len(text.encode("utf-8")) <= limit:
+        return text
+    parsed = _parse_json(text)
+    if parsed is not None:
+        # Tighten the extraction until it fits, keeping the output valid JSON
+        for max_items, max_str in ((5, 300), (3, 120), (2, 60), (1, 40)):
+            text = json.dumps(_extract_keys(parsed, max_items, max_str), indent=1, ensure_ascii=False)
+            if len(text.encode("utf-8")) <= limit:
+                return text
+    else:
+        text = _dedupe_lines(text)
+    size = len(text.encode("utf-8"))
+    if size <= limit:
+        return text
+    return _head_tail(text, limit)
+
+
+def guard_result(text: Any, max_bytes: Optional[int] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Post-process a sub-agent result before it goes back to the orchestrator.
+
+    Results within the cap are returned unchanged. Larger results are compacted and
+    the full payload is stored out-of-band; the returned dict then carries a handle
+    the orchestrator can pass to the `retrieve_full_result` tool.
+    """
+    text = text if isinstance(text, str) else str(text)
+    limit = result_byte_limit(max_bytes, max_tokens)
+    size = len(text.encode("utf-8"))
+    if size <= limit:
+        return {"result": text}
+
+    handle = get_result_store().put(text)
+    print(f"Result guard: compacted {size} bytes to <= {limit} bytes (handle {handle})")
+    return {
+        "result": compact_text(text, limit),
+        "truncated": True,
+        "original_bytes": size,
+        "full_result_handle": handle,
+        "note": f"Result was compacted. Call {RETRIEVE_TOOL_NAME} with this handle to read more of it.",
+    }
+
+
+async def retrieve_full_result(handle: str, offset: int = 0, length: int = 4000) -> Dict[str, Any]:
+    """
+    Read part of a sub-agent result that was compacted because it was too large.
+    Use this tool only when the compacted result is missing details you need.
+
+    Args:
+        handle: The `full_result_handle` returned with the compacted result.
+        offset: Character offset to start reading from.
+        length: Number of characters to read (capped to the result size limit).
+
+    Returns:
+        The requested slice, the total length and the offset to continue from.
+    """
+    text = get_result_store().get(handle)
+    if text is None:
+        return {"error": f"No stored result for handle {handle!r}; it may have expired."}
+    length = max(0, min(length, result_byte_limit()))
+    offset = max(0, offset)
+    chunk = text[offset:offset + length]
+    end = offset + len(chunk)
+    return {"content": chunk, "total_length": len(text), "next_offset": end if end < len(text) else None}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import os
+
+import yaml
+
+from mcp_servers import MCPServerSpec
+
+# Path to the declarative service registry. Override with SERVICES_CONFIG.
+DEFAULT_SERVICES_CONFIG = Path(__file__).resolve().parent / "services.yaml"
+
+# ========== Service definitions ==========
+
+@dataclass(frozen=True)
+class ServiceConfig:
+    """One sub-agent service: its MCP server, prompt, model tier and orchestrator tool."""
+    name: str
+    server: MCPServerSpec
+    system_prompt: str
+    description: str
+    tool_name: str
+    model_tier: str = "default"
+    enabled: bool = True
+    # Caps on the result handed back to the orchestrator; None uses the result_guard defaults.
+    max_result_bytes: Optional[int] = None
+    max_result_tokens: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any]) -> "ServiceConfig":
+        for key in ("server", "system_prompt"):
+            if not config.get(key):
+                raise ValueError(f"Service '{name}' is missing required field '{key}'.")
+        return cls(
+            name=name,
+            server=MCPServerSpec.from_config(name, config["server"]),
+            system_prompt=config["system_prompt"].strip(),
+            description=(config.get("description") or f"Use the {name} subagent.").strip(),
+            tool_name=config.get("tool_name") or f"use_{name}_agent",
+            model_tier=str(config.get("model_tier", "default")),
+            enabled=bool(config.get("enabled", True)),
+            max_result_bytes=_optional_int(config.get("max_result_bytes")),
+            max_result_tokens=_optional_int(config.get("max_result_tokens")),
+        )
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def load_services(path: Optional[str | Path] = None, include_disabled: bool = False) -> List[ServiceConfig]:
+    """
+    Load the service registry.
+
+    Args:
+        path: YAML file to read. Defaults to SERVICES_CONFIG or services.yaml next to this module.
+        include_disabled: Also return services with `enabled: false`.
+
+    Returns:
+        The services in file order.
+    """
+    path = Path(path or os.getenv("SERVICES_CONFIG") or DEFAULT_SERVICES_CONFIG)
+    with open(path) as f:
+        raw = yaml.safe_load(f) or {}
+
+    services = [ServiceConfig.from_config(name, config or {}) for name, config in (raw.get("services") or {}).items()]
+
+    tool_names = [service.tool_name for service in services]
+    duplicates = {name for name in tool_names if tool_names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate tool names in {path}: {', '.join(sorted(duplicates))}")
+
+    if include_disabled:
+        return services
+    return [service for service in services if service.enabled]
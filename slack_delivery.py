@@ -0,0 +1,251 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import os
+import time
+
+from slack_sdk.errors import SlackApiError
+
+# Slack truncates very long messages and renders anything over ~4000 characters poorly.
+SLACK_MAX_MESSAGE_CHARS = 3900
+# chat.postMessage allows about one message per second per channel, with short bursts.
+DEFAULT_CHANNEL_RATE_PER_SEC = 1.0
+DEFAULT_CHANNEL_BURST = 3
+DEFAULT_MAX_RETRIES = 3
+# Per-channel senders exit after this long without work and are recreated on demand.
+SENDER_IDLE_SECONDS = 60.0
+
+# ========== Message chunking ==========
+
+def _find_cut(text: str, budget: int) -> int:
+    """Pick where to cut `text` so the first part is at most `budget` chars, preferring markdown boundaries."""
+    window = text[:budget]
+    for separator in ("\n\n", "\n", ". ", " "):
+        index = window.rfind(separator)
+        if index > budget // 2:
+            return index + len(separator)
+    return budget
+
+
+def split_message(text: str, limit: int = SLACK_MAX_MESSAGE_CHARS) -> List[str]:
+    """
+    Split `text` into chunks of at most `limit` characters.
+
+    Cuts at paragraph, line, sentence or word boundaries, in that order of preference.
+    A code block that spans a cut is closed at the end of one chunk and reopened,
+    with the same language tag, at the start of the next.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks: List[str] = []
+    remaining = text
+    open_fence: Optional[str] = None
+    while remaining:
+        prefix = f"{open_fence}\n" if open_fence else ""
+        budget = max(1, limit - len(prefix) - len("\n```"))
+        if len(remaining) <= budget:
+            piece, remaining = remaining, ""
+        else:
+            cut = _find_cut(remaining, budget)
+            piece, remaining = remaining[:cut].rstrip(), remaining[cut:].lstrip("\n")
+
+        body = prefix + piece
+        open_fence = None
+        for line in body.splitlines():
+            if line.strip().startswith("```"):
+                open_fence = None if open_fence else line.strip()
+        if open_fence:
+            body += "\n```"
+        chunks.append(body)
+    return chunks
+
+
+# ========== Rate limiting ==========
+
+class TokenBucket:
+    """Async token bucket. `pause` blocks all acquisitions until a point in time (used for Retry-After)."""
+
+    def __init__(self, rate_per_sec: float, capacity: int):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+# ========== Delivery queue ==========
+
+@dataclass
+class OutboundMessage:
+    channel: str
+    chunks: List[str]
+    thread_ts: Optional[str] = None
+    # Chunks after the first are threaded under the first one unless a thread was given
+    sent: int = 0
+    attempts: int = 0
+
+
+class SlackDeliveryQueue:
+    """
+    Fire-and-forget outbound Slack messages.
+
+    `send` only enqueues and returns immediately. Each channel gets its own sender
+    task and token bucket, so messages to one channel are delivered in order and
+    paced to Slack's per-channel limit without holding up the caller. Rate-limit
+    responses pause the channel for the `Retry-After` period and the message is
+    retried; other failures are retried with backoff up to `max_retries`.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        rate_per_sec: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_message_chars: int = SLACK_MAX_MESSAGE_CHARS,
+    ):
+        self.client = client
+        self.rate_per_sec = rate_per_sec or float(os.getenv("SLACK_CHANNEL_RATE_PER_SEC", DEFAULT_CHANNEL_RATE_PER_SEC))
+        self.burst = burst or int(os.getenv("SLACK_CHANNEL_BURST", DEFAULT_CHANNEL_BURST))
+        self.max_retries = max_retries
+        self.max_message_chars = max_message_chars
+        self._queues: Dict[str, Deque[OutboundMessage]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
+        self._closed = False
+
+    def send(self, channel: str, text: str, thread_ts: Optional[str] = None) -> None:
+        """Queue `text` for `channel`, split into Slack-sized chunks. Returns immediately."""
+        if self._closed:
+            print(f"Warning: Slack delivery queue is closed, dropping message to {channel}.")
+            return
+        message = OutboundMessage(channel=channel, chunks=split_message(text, self.max_message_chars), thread_ts=thread_ts)
+        self._queues.setdefault(channel, deque()).append(message)
+        self._wakeups.setdefault(channel, asyncio.Event()).set()
+        sender = self._senders.get(channel)
+        if sender is None or sender.done():
+            self._senders[channel] = asyncio.create_task(self._sender(channel))
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _sender(self, channel: str) -> None:
+        queue = self._queues[channel]
+        wakeup = self._wakeups[channel]
+        bucket = self._buckets.setdefault(channel, TokenBucket(self.rate_per_sec, self.burst))
+        while True:
+            if not queue:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), SENDER_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    if not queue:
+                        return
+                continue
+
+            message = queue[0]
+            while message.sent < len(message.chunks):
+                await bucket.acquire()
+                try:
+                    response = await self.client.chat_postMessage(
+                        channel=channel, text=message.chunks[message.sent], thread_ts=message.thread_ts
+                    )
+                except Exception as e:
+                    if self._handle_failure(message, bucket, e):
+                        continue
+                    break
+                if message.sent == 0 and message.thread_ts is None and len(message.chunks) > 1:
+                    message.thread_ts = response.get("ts")
+                message.sent += 1
+                message.attempts = 0
+            queue.popleft()
+
+    def _handle_failure(self, message: OutboundMessage, bucket: TokenBucket, error: Exception) -> bool:
+        """Decide whether to retry the current chunk. Returns False when the message is given up on."""
+        response = getattr(error, "response", None)
+        if response is not None and getattr(response, "status_code", None) == 429:
+            retry_after = float((getattr(response, "headers", None) or {}).get("Retry-After", 1))
+            print(f"Slack rate limited channel {message.channel}, retrying in {retry_after}s.")
+            bucket.pause(retry_after)
+            return True
+
+        message.attempts += 1
+        detail = response["error"] if isinstance(error, SlackApiError) and response is not None else error
+        if message.attempts > self.max_retries:
+            print(f"Error: giving up on Slack message to {message.channel} after {message.attempts} attempts: {detail}")
+            return False
+        print(f"Slack send to {message.channel} failed ({detail}), retry {message.attempts}/{self.max_retries}.")
+        bucket.pause(min(2 ** message.attempts, 30))
+        return True
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting messages and wait up to `timeout` seconds for queued ones to be delivered."""
+        self._closed = True
+        senders = [task for task in self._senders.values() if not task.done()]
+        if not senders:
+            return
+        # Idle senders are just waiting for work, so cancel everything once the queues are empty
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in senders:
+            task.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        if self.pending():
+            print(f"Warning: {self.pending()} Slack message(s) were not delivered before shutdown.")
+
+
+# Keyed by bot token, since Slack's limits apply per token and Bolt builds a new
+# client object for every event; clients without a token are keyed by identity
+_queues: Dict[Any, SlackDeliveryQueue] = {}
+
+def get_delivery_queue(client: Any) -> SlackDeliveryQueue:
+    """Return the delivery queue for a Slack client's bot token, creating it on first use."""
+    key = getattr(client, "token", None) or id(client)
+    queue = _queues.get(key)
+    if queue is None or (key == id(client) and queue.client is not client):
+        queue = _queues[key] = SlackDeliveryQueue(client)
+    return queue
+
+
+async def close_delivery_queues(timeout: float = 10.0) -> None:
+    """Drain and close every delivery queue (called on shutdown)."""
+    queues = list(_queues.values())
+    _queues.clear()
+    await asyncio.gather(*(queue.close(timeout) for queue in queues))
+
+
+def reply_thread_ts(event: Dict[str, Any]) -> Optional[str]:
+    """
+    Thread to reply in for an incoming message event.
+
+    Replies stay in the thread the user wrote in. Top-level messages get top-level
+    replies unless SLACK_REPLY_IN_THREAD is enabled, in which case the reply is
+    threaded under the user's message.
+    """
+    if event.get("thread_ts"):
+        return event["thread_ts"]
+    if os.getenv("SLACK_REPLY_IN_THREAD", "false").lower() in ("1", "true", "yes"):
+        return event.get("ts")
+    return None
@@ -3,34 +3,36 @@ import time
 import hmac
 import hashlib
 import json
+from functools import lru_cache
+from typing import Any, Optional
 from fastapi import APIRouter, Request, HTTPException, Depends, BackgroundTasks # Import BackgroundTasks
 from fastapi.responses import JSONResponse
 from slack_sdk.web.async_client import AsyncWebClient # Use async client
-from slack_sdk.errors import SlackApiError
-from pydantic_ai import Agent # Import Agent for type hinting
 
 # Import shared utilities
+from request_limits import bound_request, run_bounded
+from slack_delivery import get_delivery_queue, reply_thread_ts
 from supabase_utils import fetch_conversation_history, store_message
-from pydantic_ai.messages import ModelRequest, ModelResponse, UserPromptPart, TextPart
+from usage_accounting import track_request
 
 router = APIRouter()
 
-# Load secrets and bot user ID from environment
-SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-SLACK_BOT_USER_ID = os.getenv("SLACK_BOT_USER_ID") # Added Bot User ID
-
-if not SLACK_SIGNING_SECRET or not SLACK_BOT_TOKEN:
-    print("Warning: SLACK_SIGNING_SECRET or SLACK_BOT_TOKEN environment variables not set.")
-    # Allow initialization but endpoint will likely fail signature check or Slack API calls
-    slack_client = None
-else:
-    slack_client = AsyncWebClient(token=SLACK_BOT_TOKEN)
+# Secrets and the bot user ID are read from the environment when needed rather than
+# at import time, so the module can be imported before the environment is loaded.
+@lru_cache(maxsize=1)
+def get_slack_client() -> AsyncWebClient | None:
+    """Return the shared Slack web client, or None if SLACK_SIGNING_SECRET / SLACK_BOT_TOKEN are not set."""
+    if not os.getenv("SLACK_SIGNING_SECRET") or not os.getenv("SLACK_BOT_TOKEN"):
+        print("Warning: SLACK_SIGNING_SECRET or SLACK_BOT_TOKEN environment variables not set.")
+        # Allow initialization but endpoint will likely fail signature check or Slack API calls
+        return None
+    return AsyncWebClient(token=os.getenv("SLACK_BOT_TOKEN"))
 
 # --- HMAC Signature Verification ---
 # Modified to accept body bytes as argument
 async def verify_slack_signature(request: Request, body_bytes: bytes) -> bool:
     """Verifies the request signature using the Slack signing secret."""
+    SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
     if not SLACK_SIGNING_SECRET:
         print("Error: SLACK_SIGNING_SECRET not configured.")
         return False # Cannot verify without the secret
@@ -68,10 +70,14 @@ async def process_slack_event(
     channel: str,
     session_id: str,
     request_id: str,
-    primary_agent: Agent, # Pass the agent instance
-    slack_client: AsyncWebClient | None # Pass the slack client instance
+    primary_agent: Any, # Pass the agent instance
+    slack_client: AsyncWebClient | None, # Pass the slack client instance
+    thread_ts: Optional[str] = None # Thread to reply in, if any
 ):
     """Handles the actual processing of the Slack message in the background."""
+    from mcp_agent_army import PRIMARY_SYSTEM_PROMPT
+    from prompt_cache import build_message_history
+
     print(f"Background task started for request_id: {request_id}")
 
     # --- Quick Greeting Logic ---
@@ -85,8 +91,8 @@ async def process_slack_event(
             await store_message(session_id=session_id, message_type="human", content=text)
             await store_message(session_id=session_id, message_type="ai", content=quick_response, data={"request_id": request_id, "quick_response": True})
             if slack_client:
-                await slack_client.chat_postMessage(channel=channel, text=quick_response)
-                print("Quick response sent to Slack.")
+                get_delivery_queue(slack_client).send(channel, quick_response, thread_ts=thread_ts)
+                print("Quick response queued for Slack.")
             else:
                  print("Error: Slack client not initialized, cannot send quick response.")
         except Exception as e:
@@ -102,17 +108,7 @@ async def process_slack_event(
         print(f"Fetched {len(conversation_history)} messages (background).")
 
          # Convert conversation history to format expected by agent
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = msg_data["type"]
-            msg_content = msg_data["content"]
-            # Ensure content is string, handle potential non-string data if necessary
-            if isinstance(msg_content, str):
-                 msg_obj = ModelRequest(parts=[UserPromptPart(content=msg_content)]) if msg_type == "human" else ModelResponse(parts=[TextPart(content=msg_content)])
-                 messages.append(msg_obj)
-            else:
-                 print(f"Warning: Skipping message with non-string content: {msg_content}")
+        messages = build_message_history(conversation_history, PRIMARY_SYSTEM_PROMPT)
 
         # Store incoming user message (already stored before starting background task usually, but maybe store again here for atomicity?)
         # Let's assume storing before background task is sufficient for now. If issues arise, reconsider.
@@ -121,22 +117,22 @@ async def process_slack_event(
 
         # Run the agent
         print(f"Running primary agent for query: '{text}' (background)")
-        result = await primary_agent.run(text, message_history=messages)
+        with track_request(request_id, session_id, source="slack-events", channel=channel) as usage, bound_request():
+            result = await run_bounded(primary_agent, text, message_history=messages, usage_limits=usage.usage_limits())
         response_text = result.data if hasattr(result, "data") else str(result)
         print(f"Agent returned response: '{response_text}' (background)")
 
         # Store agent response
-        await store_message(session_id=session_id, message_type="ai", content=response_text, data={"request_id": request_id})
+        await store_message(session_id=session_id, message_type="ai", content=response_text, data={"request_id": request_id, "usage": usage.summary()})
 
         # Send response back to Slack
         if slack_client:
-            await slack_client.chat_postMessage(channel=channel, text=response_text)
-            print("Agent response sent to Slack.")
+            # Delivered in the background: chunked, paced per channel and retried on rate limits
+            get_delivery_queue(slack_client).send(channel, response_text, thread_ts=thread_ts)
+            print("Agent response queued for Slack.")
         else:
             print("Error: Slack client not initialized, cannot send agent response.")
 
-    except SlackApiError as e:
-        print(f"Slack API Error during background processing: {e.response['error']}")
     except HTTPException as e:
          # If Supabase utils raise HTTPException, log it
          print(f"HTTPException during background processing: {e.detail}")
@@ -144,10 +140,7 @@ async def process_slack_event(
         print(f"General error during background processing: {e}")
         # Try to send a generic error message back to Slack
         if slack_client:
-            try:
-                await slack_client.chat_postMessage(channel=channel, text="Sorry, I encountered an error processing your request.")
-            except SlackApiError as slack_err:
-                 print(f"Failed to send error message to Slack: {slack_err.response['error']}")
+            get_delivery_queue(slack_client).send(channel, "Sorry, I encountered an error processing your request.", thread_ts=thread_ts)
 
 # --- Slack Events Endpoint ---
 @router.post("/slack/events")
@@ -183,7 +176,7 @@ async def slack_events(request: Request, background_tasks: BackgroundTasks): # A
             event_type == "message"
             and "subtype" not in event
             and event.get("user")
-            and event.get("user") != SLACK_BOT_USER_ID # Check against bot user ID
+            and event.get("user") != os.getenv("SLACK_BOT_USER_ID") # Check against bot user ID
         ):
             user_id = event.get("user")
             text = event.get("text", "").strip()
@@ -209,7 +202,8 @@ async def slack_events(request: Request, background_tasks: BackgroundTasks): # A
                 session_id=session_id,
                 request_id=request_id,
                 primary_agent=primary_agent_instance,
-                slack_client=slack_client
+                slack_client=get_slack_client(),
+                thread_ts=reply_thread_ts(event)
             )
             print(f"Scheduled background task for request_id: {request_id}")
 
@@ -0,0 +1,48 @@
+#!/bin/sh
+# Container entry point.
+#
+# WEB_CONCURRENCY=1 (default): a single uvicorn worker that spawns its own MCP servers.
+# WEB_CONCURRENCY>1: the MCP servers run once in the shared sidecar (mcp_sidecar.py) and
+# every worker connects to it over SSE; one worker owns the Slack Socket Mode connection.
+set -e
+
+WORKERS="${WEB_CONCURRENCY:-1}"
+
+if [ "$WORKERS" -gt 1 ]; then
+    SIDECAR_PORT="${MCP_SIDECAR_PORT:-8765}"
+    export MCP_SIDECAR_URL="${MCP_SIDECAR_URL:-http://127.0.0.1:${SIDECAR_PORT}}"
+
+    python mcp_sidecar.py &
+    SIDECAR_PID=$!
+
+    # Wait until every MCP server in the sidecar is up before starting the workers
+    echo "Waiting for MCP sidecar at ${MCP_SIDECAR_URL}..."
+    until curl -sf "${MCP_SIDECAR_URL}/healthz" > /dev/null; do
+        if ! kill -0 "$SIDECAR_PID" 2>/dev/null; then
+            echo "MCP sidecar exited during startup" >&2
+            exit 1
+        fi
+        sleep 0.5
+    done
+
+    uvicorn mcp_agent_army_endpoint:create_app --factory --host 0.0.0.0 --port "${PORT:-8001}" --workers "$WORKERS" &
+    UVICORN_PID=$!
+
+    # Stop both on shutdown signals, and stop the container if either one exits, so
+    # a dead sidecar gets the container restarted instead of failing every MCP call
+    STOPPING=0
+    trap 'STOPPING=1; kill -TERM "$UVICORN_PID" "$SIDECAR_PID" 2>/dev/null' TERM INT
+    while kill -0 "$SIDECAR_PID" 2>/dev/null && kill -0 "$UVICORN_PID" 2>/dev/null; do
+        sleep 1
+    done
+    if [ "$STOPPING" -eq 0 ] && ! kill -0 "$SIDECAR_PID" 2>/dev/null; then
+        echo "MCP sidecar exited; stopping the workers" >&2
+    fi
+    kill -TERM "$UVICORN_PID" "$SIDECAR_PID" 2>/dev/null || true
+    wait "$UVICORN_PID" 2>/dev/null || true
+    wait "$SIDECAR_PID" 2>/dev/null || true
+    [ "$STOPPING" -eq 1 ] && exit 0
+    exit 1
+fi
+
+exec uvicorn mcp_agent_army_endpoint:create_app --factory --host 0.0.0.0 --port "${PORT:-8001}" --workers "$WORKERS"
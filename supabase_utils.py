@@ -1,33 +1,49 @@
 import os
-from typing import List, Optional, Dict, Any
-from supabase import create_client, Client
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
 from fastapi import HTTPException # Keep HTTPException for raising errors
 
-# Load environment variables (needed for Supabase creds)
-# Consider a shared config module later if needed
-from dotenv import load_dotenv
-load_dotenv()
+if TYPE_CHECKING:
+    from supabase import Client
+
+# History reads only need the type and text of each message, not the whole JSON
+# document (which can carry large `data` payloads). PostgREST extracts the fields
+# server-side. The query is served by idx_messages_session_created_at
+# (migrations/001_messages_history_index.sql).
+HISTORY_COLUMNS = "type:message->>type,content:message->>content,created_at"
 
 # Supabase setup
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+# The client is created on first use rather than at import time, so importing this
+# module doesn't pull in the Supabase SDK. Environment variables are loaded by the
+# application factory before the first request.
+@lru_cache(maxsize=1)
+def get_supabase_client() -> "Client | None":
+    """Return the shared Supabase client, or None if credentials are not configured."""
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+
+    if not supabase_url or not supabase_key:
+        print("Warning: SUPABASE_URL or SUPABASE_SERVICE_KEY environment variables not set.")
+        # Allow initialization but functions will likely fail
+        return None
 
-if not supabase_url or not supabase_key:
-    print("Warning: SUPABASE_URL or SUPABASE_SERVICE_KEY environment variables not set.")
-    # Allow initialization but functions will likely fail
-    supabase: Client | None = None
-else:
-    supabase: Client = create_client(supabase_url, supabase_key)
+    from supabase import create_client
+    return create_client(supabase_url, supabase_key)
 
 async def fetch_conversation_history(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-    """Fetch the most recent conversation history for a session."""
+    """
+    Fetch the most recent conversation history for a session.
+
+    Returns rows with `type`, `content` and `created_at`, oldest first.
+    """
+    supabase = get_supabase_client()
     if not supabase:
         print("Error: Supabase client not initialized.")
         # Or raise an internal server error
         raise HTTPException(status_code=500, detail="Supabase client not initialized")
     try:
         response = supabase.table("messages") \
-            .select("*") \
+            .select(HISTORY_COLUMNS) \
             .eq("session_id", session_id) \
             .order("created_at", desc=True) \
             .limit(limit) \
@@ -42,7 +58,8 @@ async def fetch_conversation_history(session_id: str, limit: int = 10) -> List[D
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversation history: {str(e)}")
 
 async def store_message(session_id: str, message_type: str, content: str, data: Optional[Dict] = None):
-    """Store a message in the Supabase messages table."""
+    """Store a message in the Supabase messages table, content unchanged."""
+    supabase = get_supabase_client()
     if not supabase:
         print("Error: Supabase client not initialized.")
         # Or raise an internal server error
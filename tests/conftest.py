@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The application modules live at the repository root and the test doubles in benchmarks/
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
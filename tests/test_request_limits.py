@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from pydantic_ai import Agent
+
+from fakes import ModelScript, scripted_model
+from request_limits import RequestLimits, bound_request, record_completed, run_bounded
+
+
+def _agent(script: ModelScript, *tools) -> Agent:
+    return Agent(scripted_model(script), tools=list(tools))
+
+
+async def lookup(query: str) -> str:
+    """Look something up."""
+    return f"found {query}"
+
+
+def test_run_within_limits_returns_the_normal_result():
+    async def run():
+        with bound_request(timeout=5):
+            return await run_bounded(_agent(ModelScript(latency_ms=1, tool_calls=("lookup",)), lookup), "hi")
+
+    result = asyncio.run(run())
+    assert not getattr(result, "partial", False)
+    assert result.data == "Here is what I found."
+
+
+def test_deadline_returns_partial_answer():
+    async def run():
+        with bound_request(timeout=0.2) as limits:
+            result = await run_bounded(_agent(ModelScript(latency_ms=2000)), "hi")
+        return result, limits
+
+    start = time.monotonic()
+    result, limits = asyncio.run(run())
+    assert time.monotonic() - start < 1
+    assert result.partial
+    assert "time limit" in limits.stopped
+    assert "time limit" in result.data
+
+
+def test_tool_call_limit_stops_the_run(monkeypatch):
+    monkeypatch.setenv("MAX_TOOL_CALLS_PER_REQUEST", "2")
+
+    async def run():
+        with bound_request(timeout=5) as limits:
+            record_completed("search", "an earlier finding")
+            agent = _agent(ModelScript(latency_ms=1, tool_calls=("lookup",) * 5), lookup)
+            result = await run_bounded(agent, "hi")
+        return result, limits
+
+    result, limits = asyncio.run(run())
+    assert result.partial
+    assert limits.tool_calls == 2
+    assert "limit of 2 tool calls" in result.data
+    # Finished sub-agent results are included in the partial answer
+    assert "an earlier finding" in result.data
+
+
+def test_nested_runs_do_not_outlive_the_request(monkeypatch):
+    # Give the sub-agent more time than the orchestrator, so it is still running
+    # when the orchestrator's deadline passes
+    deadline_for = RequestLimits.deadline_for
+    monkeypatch.setattr(RequestLimits, "deadline_for", lambda self, depth: deadline_for(self, 0) + 10 * depth)
+    sub_agent = _agent(ModelScript(latency_ms=5000))
+    nested = []
+
+    async def delegate(query: str) -> str:
+        """Ask the sub-agent."""
+        nested.append(asyncio.current_task())
+        result = await run_bounded(sub_agent, query, name="sub")
+        return str(result.data)
+
+    async def run():
+        orchestrator = _agent(ModelScript(latency_ms=1, tool_calls=("delegate",)), delegate)
+        with bound_request(timeout=0.3) as limits:
+            result = await run_bounded(orchestrator, "hi")
+        return result, limits
+
+    start = time.monotonic()
+    result, limits = asyncio.run(run())
+    assert time.monotonic() - start < 2
+    assert result.partial
+    assert len(nested) == 1
+    assert nested[0].cancelled()
+    assert not limits._tasks
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from result_guard import ResultStore, _head_tail, compact_text, guard_result, result_byte_limit
+
+
+def _size(text):
+    return len(text.encode("utf-8"))
+
+
+def test_small_text_is_unchanged():
+    assert compact_text("short", 100) == "short"
+
+
+@pytest.mark.parametrize("limit", [256, 500, 1000, 4000])
+def test_head_tail_stays_within_limit(limit):
+    text = "".join(f"line {i}: some content é\n" for i in range(2000))
+    compacted = _head_tail(text, limit)
+    assert _size(compacted) <= limit
+    assert compacted.startswith("line 0:")
+    assert compacted.rstrip().endswith("line 1999: some content é")
+    assert "bytes omitted" in compacted
+
+
+def test_head_tail_does_not_split_multibyte_characters():
+    compacted = _head_tail("é" * 5000, 300)
+    assert _size(compacted) <= 300
+    compacted.encode("utf-8")  # no lone surrogates or broken sequences
+
+
+def test_repeated_lines_are_deduplicated_before_cutting():
+    text = "the same long repeated line\n" * 500 + "unique ending line\n"
+    compacted = compact_text(text, 1000)
+    assert compacted.count("the same long repeated line") == 1
+    assert "unique ending line" in compacted
+    assert "omitted" not in compacted
+
+
+def test_json_is_reduced_to_valid_json_within_limit():
+    payload = {"items": [{"id": i, "body": "x" * 1000} for i in range(200)], "total": 200}
+    compacted = compact_text(json.dumps(payload), 2000)
+    assert _size(compacted) <= 2000
+    reduced = json.loads(compacted)
+    assert reduced["total"] == 200
+    assert len(reduced["items"]) <= 6
+
+
+def test_byte_limit_uses_the_smaller_cap():
+    assert result_byte_limit(max_bytes=10000, max_tokens=100) == 400
+    assert result_byte_limit(max_bytes=1000, max_tokens=10000) == 1000
+    assert result_byte_limit(max_bytes=10, max_tokens=1) == 256
+
+
+def test_guard_result_stores_full_payload(tmp_path, monkeypatch):
+    import result_guard
+    monkeypatch.setattr(result_guard, "_store", ResultStore(tmp_path))
+    text = "\n".join(f"row {i} " + "y" * 50 for i in range(500))
+    guarded = guard_result(text, max_bytes=1000, max_tokens=10000)
+    assert guarded["truncated"] is True
+    assert _size(guarded["result"]) <= 1000
+    assert result_guard.get_result_store().get(guarded["full_result_handle"]) == text
+    assert guard_result("small", max_bytes=1000) == {"result": "small"}
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from slack_delivery import SlackDeliveryQueue, TokenBucket, _find_cut, split_message
+
+
+# ========== Message chunking ==========
+
+def test_short_message_is_not_split():
+    assert split_message("hello", limit=100) == ["hello"]
+
+
+def test_find_cut_prefers_paragraph_then_line_then_word():
+    assert _find_cut("aaaa bbbb\n\ncccc dddd", 16) == len("aaaa bbbb\n\n")
+    assert _find_cut("aaaa bbbb\ncccc dddd", 16) == len("aaaa bbbb\n")
+    assert _find_cut("aaaa bbbb cccc dddd", 16) == len("aaaa bbbb cccc ")
+
+
+def test_find_cut_falls_back_to_hard_cut():
+    assert _find_cut("x" * 50, 20) == 20
+
+
+def test_chunks_respect_limit_and_keep_all_words():
+    text = " ".join(f"word{i}" for i in range(500))
+    chunks = split_message(text, limit=200)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_code_block_spanning_a_cut_is_closed_and_reopened():
+    code = "\n".join(f"line {i} = compute({i})" for i in range(40))
+    text = f"Intro paragraph.\n\n```python\n{code}\n```\n\nOutro."
+    chunks = split_message(text, limit=300)
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert len(chunk) <= 300
+        # Every chunk has balanced fences, so Slack renders each one correctly
+        assert sum(line.strip().startswith("```") for line in chunk.splitlines()) % 2 == 0
+    for chunk in chunks[1:-1]:
+        assert chunk.startswith("```python\n")
+
+
+# ========== Rate limiting ==========
+
+def test_token_bucket_allows_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate_per_sec=20, capacity=3)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.02
+    assert total >= 0.04
+
+
+def test_token_bucket_pause_blocks_until_retry_after():
+    async def run():
+        bucket = TokenBucket(rate_per_sec=1000, capacity=5)
+        bucket.pause(0.2)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.19
+
+
+class _RateLimitedResponse(dict):
+    status_code = 429
+    headers = {"Retry-After": "0.2"}
+
+
+class _FlakyClient:
+    """Rejects the first post with a 429, then records every message."""
+
+    def __init__(self):
+        self.calls = 0
+        self.sent = []
+
+    async def chat_postMessage(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise SlackApiError("ratelimited", _RateLimitedResponse(ok=False, error="ratelimited"))
+        self.sent.append((time.monotonic(), kwargs))
+        return {"ok": True, "ts": f"{self.calls}.0"}
+
+
+def test_delivery_queue_retries_after_rate_limit():
+    async def run():
+        client = _FlakyClient()
+        queue = SlackDeliveryQueue(client, rate_per_sec=100, burst=5)
+        start = time.monotonic()
+        queue.send("C1", "first")
+        queue.send("C1", "second")
+        await queue.close(timeout=5)
+        return start, client
+
+    start, client = asyncio.run(run())
+    assert [kwargs["text"] for _, kwargs in client.sent] == ["first", "second"]
+    assert client.sent[0][0] - start >= 0.19
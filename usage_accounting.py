@@ -0,0 +1,329 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from pydantic_ai.usage import UsageLimits
+
+ORCHESTRATOR = "orchestrator"
+# Usage detail keys that report prompt tokens served from the provider's prompt cache
+CACHED_TOKEN_DETAILS = ("cached_tokens", "cached_content_token_count")
+
+# ========== Per-request ledger ==========
+
+@dataclass
+class AgentUsage:
+    """Token usage of one agent (orchestrator or a sub-agent) within a request."""
+    model: str = ""
+    runs: int = 0
+    requests: int = 0
+    request_tokens: int = 0
+    response_tokens: int = 0
+    total_tokens: int = 0
+    # Part of request_tokens read from the provider's prompt cache
+    cached_tokens: int = 0
+
+    def add(self, usage: Any) -> None:
+        self.runs += 1
+        self.requests += usage.requests or 0
+        self.request_tokens += usage.request_tokens or 0
+        self.response_tokens += usage.response_tokens or 0
+        self.total_tokens += usage.total_tokens or ((usage.request_tokens or 0) + (usage.response_tokens or 0))
+        self.cached_tokens += sum((usage.details or {}).get(key, 0) for key in CACHED_TOKEN_DETAILS)
+
+
+@dataclass
+class RequestUsage:
+    """
+    Usage of every agent run made while handling one request.
+
+    The orchestrator and each sub-agent run record into the same ledger (found
+    through a context variable), so nested runs are attributed to the request,
+    session and channel that caused them.
+    """
+    request_id: str
+    session_id: str
+    source: str = "api"
+    channel: Optional[str] = None
+    agents: Dict[str, AgentUsage] = field(default_factory=dict)
+    budget_exceeded: bool = False
+    # Live usage of runs that haven't finished yet (see start_run)
+    _running: List[Any] = field(default_factory=list, repr=False)
+
+    def start_run(self, usage: Any) -> None:
+        """Count a run's usage towards the budgets while it is still in progress."""
+        self._running.append(usage)
+
+    def record(self, agent: str, usage: Any, model: str = "") -> None:
+        self._running = [running for running in self._running if running is not usage]
+        entry = self.agents.setdefault(agent, AgentUsage(model=model))
+        entry.add(usage)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(entry.total_tokens for entry in self.agents.values())
+
+    def spent_tokens(self) -> int:
+        """Tokens spent so far, including those of runs still in progress."""
+        return self.total_tokens + sum(usage.total_tokens or 0 for usage in self._running)
+
+    def remaining_tokens(self) -> Optional[int]:
+        """Tokens this request may still spend under the request and session budgets, or None if unlimited."""
+        spent = self.spent_tokens()
+        limits = [
+            limit - used
+            for limit, used in (
+                (_env_int("REQUEST_TOKEN_BUDGET"), spent),
+                (_env_int("SESSION_TOKEN_BUDGET"), get_session_budgets().spent(self.session_id) + spent),
+            )
+            if limit is not None
+        ]
+        return min(limits) if limits else None
+
+    def budget_spent(self) -> bool:
+        remaining = self.remaining_tokens()
+        if remaining is not None and remaining <= 0:
+            self.budget_exceeded = True
+        return self.budget_exceeded
+
+    def usage_limits(self) -> "UsageLimits":
+        """
+        Limits for the next agent run: the model-call cap and whatever token budget is left.
+
+        The budget is shared with the other runs of the request, so `run_bounded` also
+        checks it between steps and stops the whole request once it is spent.
+        """
+        from pydantic_ai.usage import UsageLimits
+        remaining = self.remaining_tokens()
+        return UsageLimits(
+            request_limit=_env_int("AGENT_REQUEST_LIMIT") or 50,
+            total_tokens_limit=max(remaining, 0) if remaining is not None else None,
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact form stored with the AI message `data`."""
+        agents = {name: asdict(entry) for name, entry in self.agents.items()}
+        for name, entry in self.agents.items():
+            cost = estimate_cost(entry)
+            if cost is not None:
+                agents[name]["cost_usd"] = cost
+        costs = [entry.get("cost_usd") for entry in agents.values()]
+        summary: Dict[str, Any] = {
+            "total_tokens": self.total_tokens,
+            "model_requests": sum(entry.requests for entry in self.agents.values()),
+            "cached_tokens": sum(entry.cached_tokens for entry in self.agents.values()),
+            "agents": agents,
+        }
+        if costs and all(cost is not None for cost in costs):
+            summary["cost_usd"] = round(sum(costs), 6)
+        if self.budget_exceeded:
+            summary["budget_exceeded"] = True
+        return summary
+
+
+_current_request: ContextVar[Optional[RequestUsage]] = ContextVar("current_request_usage", default=None)
+
+
+def current_request() -> Optional[RequestUsage]:
+    return _current_request.get()
+
+
+@contextmanager
+def track_request(request_id: str, session_id: str, source: str = "api", channel: Optional[str] = None) -> Iterator[RequestUsage]:
+    """
+    Collect usage for everything run inside the block.
+
+    On exit the totals are added to the session budget and the exported metrics,
+    whether or not the request succeeded.
+    """
+    ledger = RequestUsage(request_id=request_id, session_id=session_id, source=source, channel=channel)
+    token = _current_request.set(ledger)
+    try:
+        yield ledger
+    except Exception as e:
+        from pydantic_ai.exceptions import UsageLimitExceeded
+        if isinstance(e, UsageLimitExceeded):
+            ledger.budget_exceeded = True
+        raise
+    finally:
+        _current_request.reset(token)
+        get_session_budgets().add(session_id, ledger.total_tokens)
+        get_usage_metrics().observe(ledger)
+
+
+def record_run(agent: str, result: Any, model: Any = None) -> None:
+    """Record the usage of a finished agent run in the current request's ledger, if there is one."""
+    if result is not None:
+        record_usage(agent, result.usage(), model)
+
+
+def record_usage(agent: str, usage: Any, model: Any = None) -> None:
+    """Record an agent run's usage, finished or not, in the current request's ledger, if there is one."""
+    ledger = _current_request.get()
+    if ledger is None or usage is None:
+        return
+    ledger.record(agent, usage, model_name(model))
+
+
+def usage_limits() -> Optional["UsageLimits"]:
+    """Limits for an agent run in the current request, or None outside a tracked request."""
+    ledger = _current_request.get()
+    return ledger.usage_limits() if ledger else None
+
+
+def model_name(model: Any) -> str:
+    if model is None:
+        return ""
+    return getattr(model, "model_name", None) or str(model)
+
+
+# ========== Pricing ==========
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def _prices() -> Dict[str, Dict[str, float]]:
+    """MODEL_PRICES_JSON: {"model": {"input": usd_per_million, "output": usd_per_million, "cached_input": usd_per_million}}."""
+    raw = os.getenv("MODEL_PRICES_JSON")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        print("Warning: MODEL_PRICES_JSON is not valid JSON; costs will not be estimated.")
+        return {}
+
+
+def estimate_cost(entry: AgentUsage) -> Optional[float]:
+    price = _prices().get(entry.model)
+    if not price:
+        return None
+    input_price = price.get("input", 0)
+    cached = min(entry.cached_tokens, entry.request_tokens)
+    cost = (
+        (entry.request_tokens - cached) * input_price
+        + cached * price.get("cached_input", input_price)
+        + entry.response_tokens * price.get("output", 0)
+    )
+    return round(cost / 1_000_000, 6)
+
+
+# ========== Session budgets ==========
+
+class SessionBudgets:
+    """
+    Tokens spent per session within a rolling window (SESSION_BUDGET_WINDOW_SECONDS).
+
+    Kept in process memory, so with several workers each one enforces the budget
+    for the requests it handles.
+    """
+
+    def __init__(self, window_seconds: Optional[int] = None):
+        self.window_seconds = window_seconds or _env_int("SESSION_BUDGET_WINDOW_SECONDS") or 24 * 3600
+        self._spent: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def spent(self, session_id: str) -> int:
+        with self._lock:
+            started, tokens = self._spent.get(session_id, (0.0, 0))
+            if time.monotonic() - started > self.window_seconds:
+                return 0
+            return tokens
+
+    def add(self, session_id: str, tokens: int) -> None:
+        if not tokens:
+            return
+        with self._lock:
+            now = time.monotonic()
+            started, spent = self._spent.get(session_id, (now, 0))
+            if now - started > self.window_seconds:
+                started, spent = now, 0
+            self._spent[session_id] = (started, spent + tokens)
+            if len(self._spent) > 10000:
+                self._spent = {key: value for key, value in self._spent.items() if now - value[0] <= self.window_seconds}
+
+
+_session_budgets: Optional[SessionBudgets] = None
+
+def get_session_budgets() -> SessionBudgets:
+    global _session_budgets
+    if _session_budgets is None:
+        _session_budgets = SessionBudgets()
+    return _session_budgets
+
+
+# ========== Metrics export ==========
+
+def worker_label() -> str:
+    """
+    `worker` label added to every exported series.
+
+    Counters live in each process; with several uvicorn workers behind one port a
+    scrape reaches any of them, so each series must say which process it is from
+    (sum over `worker` in queries).
+    """
+    return f'worker="{os.getpid()}"'
+
+
+class UsageMetrics:
+    """Cumulative usage counters, rendered in the Prometheus text format by the /metrics endpoint."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, metric: str, labels: Dict[str, str], value: float) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, ledger: RequestUsage) -> None:
+        base = {"source": ledger.source, "channel": ledger.channel or ""}
+        with self._lock:
+            self._inc("mcp_agent_army_requests_total", base, 1)
+            if ledger.budget_exceeded:
+                self._inc("mcp_agent_army_budget_exceeded_total", base, 1)
+            for agent, entry in ledger.agents.items():
+                labels = {**base, "agent": agent, "model": entry.model}
+                self._inc("mcp_agent_army_agent_runs_total", labels, entry.runs)
+                self._inc("mcp_agent_army_model_requests_total", labels, entry.requests)
+                self._inc("mcp_agent_army_tokens_total", {**labels, "kind": "request"}, entry.request_tokens)
+                self._inc("mcp_agent_army_tokens_total", {**labels, "kind": "response"}, entry.response_tokens)
+                # Included in kind="request"; the hit rate is cached / request
+                self._inc("mcp_agent_army_tokens_total", {**labels, "kind": "cached"}, entry.cached_tokens)
+                cost = estimate_cost(entry)
+                if cost is not None:
+                    self._inc("mcp_agent_army_cost_usd_total", labels, cost)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._counters.items())
+        current = None
+        for (metric, labels), value in items:
+            if metric != current:
+                lines.append(f"# TYPE {metric} counter")
+                current = metric
+            label_text = ",".join([worker_label(), *(f'{key}="{_escape(val)}"' for key, val in labels)])
+            lines.append(f"{metric}{{{label_text}}} {int(value) if value == int(value) else value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics: Optional[UsageMetrics] = None
+
+def get_usage_metrics() -> UsageMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = UsageMetrics()
+    return _metrics